@@ -17,6 +17,8 @@ from tqdm.auto import tqdm
 
 from vosk import Model, KaldiRecognizer
 
+from vad import detect_speech_regions_wav, read_wav_blocks, TimeOffsetMap
+
 from pinecone import Pinecone, ServerlessSpec
 
 from langchain.chains import RetrievalQA
@@ -66,21 +68,71 @@ def is_valid_youtube_url(url):
     pattern = r'^(https?://)?(www\.)?(youtube\.com|youtu\.?be)/.+$'
     return re.match(pattern, url) is not None
 
-def download_video(url):
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'wav',
-            'preferredquality': '192',
-        }],
-        'outtmpl': 'audio.%(ext)s',
-        'ffmpeg_location': '/usr/local/bin'  # Explicitly set the ffmpeg location
-    }
+def download_video(url, lean=True):
+    """Download the audio track of a video as a WAV file.
+
+    With lean=True the smallest audio-only stream that is still good enough for
+    16 kHz speech recognition is fetched with concurrent fragments and resume
+    support, and ffmpeg writes 16 kHz mono PCM straight away so transcribe_audio
+    never has to convert it again. lean=False keeps the original best-quality
+    download.
+    """
+    if lean:
+        ydl_opts = {
+            # Smallest audio-only format of at least 32 kbps, else whatever audio is available
+            'format': 'worstaudio[abr>=32]/bestaudio[abr<=128]/bestaudio/best',
+            'concurrent_fragment_downloads': 4,
+            'continuedl': True,
+            'retries': 10,
+            'fragment_retries': 10,
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'wav',
+            }],
+            # Resample to the recognizer's format during the same ffmpeg pass
+            'postprocessor_args': {
+                'extractaudio': ['-acodec', 'pcm_s16le', '-ac', '1', '-ar', '16000'],
+            },
+            'outtmpl': 'audio.%(ext)s',
+            'ffmpeg_location': '/usr/local/bin'  # Explicitly set the ffmpeg location
+        }
+    else:
+        ydl_opts = {
+            'format': 'bestaudio/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'wav',
+                'preferredquality': '192',
+            }],
+            'outtmpl': 'audio.%(ext)s',
+            'ffmpeg_location': '/usr/local/bin'  # Explicitly set the ffmpeg location
+        }
+
+    # Count the bytes that actually come over the network. yt-dlp reports
+    # downloaded_bytes from the size of the .part file a resumed download
+    # starts with, so that size is subtracted afterwards.
+    transferred = {}
+
+    def count_bytes(status):
+        if status.get('downloaded_bytes') is not None:
+            transferred[status['filename']] = status['downloaded_bytes']
+
+    ydl_opts['progress_hooks'] = [count_bytes]
 
     try:
+        start_time = time.time()
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+            info = ydl.extract_info(url, download=False)
+            part_file = ydl.prepare_filename(info) + '.part'
+            resumed = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+            ydl.process_ie_result(info, download=True)
+        elapsed = time.time() - start_time
+        downloaded = max(0, sum(transferred.values()) - resumed)
+        duration = info.get('duration')
+        if downloaded and duration:
+            hours = duration / 3600
+            print(f"Downloaded {downloaded / 1e6:.1f} MB in {elapsed:.1f}s "
+                  f"({downloaded / 1e6 / hours:.1f} MB and {elapsed / hours:.1f}s per hour of video)")
         return 'audio.wav'
     except Exception as e:
         print(f"An error occurred during download: {str(e)}")
@@ -102,38 +154,70 @@ def convert_audio(input_file, output_file):
         print(f"Error converting audio: {e}")
         return False
 
-def transcribe_audio(audio_file):
+def _collect_segment(rec_result, offset_map, results, segments, region=None):
+    part_result = json.loads(rec_result)
+    text = part_result.get('text', '')
+    results.append(text)
+    words = part_result.get('result')
+    if text and words:
+        segments.append({
+            'text': text,
+            'start': offset_map.to_original(words[0]['start'], region),
+            'end': offset_map.to_original(words[-1]['end'], region),
+        })
+
+def transcribe_audio(audio_file, use_vad=True, return_segments=False):
     if not os.path.exists("model"):
         print("Speech recognition model not found. Please make sure you've downloaded it.")
         return None
 
     model = Model("model")
     rec = KaldiRecognizer(model, 16000)
+    rec.SetWords(True)
 
     try:
         wf = wave.open(audio_file, "rb")
-        if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getcomptype() != "NONE":
+        if (wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getcomptype() != "NONE"
+                or wf.getframerate() != 16000):
             print("Converting audio to the correct format...")
             converted_file = "converted_audio.wav"
             if not convert_audio(audio_file, converted_file):
                 return None
             wf = wave.open(converted_file, "rb")
 
-        results = []
+        # The audio is read a block at a time, both for the VAD and for Vosk
         total_frames = wf.getnframes()
-        with tqdm(total=total_frames, desc="Transcribing") as pbar:
-            while True:
-                data = wf.readframes(4000)
-                if len(data) == 0:
-                    break
-                if rec.AcceptWaveform(data):
-                    part_result = json.loads(rec.Result())
-                    results.append(part_result['text'])
-                pbar.update(4000)
-
-        part_result = json.loads(rec.FinalResult())
-        results.append(part_result['text'])
-        return " ".join(results)
+        if use_vad:
+            regions = detect_speech_regions_wav(wf)
+        else:
+            regions = [(0, total_frames)]
+        offset_map = TimeOffsetMap(regions)
+        skipped = 1 - offset_map.kept_samples / max(total_frames, 1)
+        print(f"Voice activity detection: skipping {skipped:.1%} of the audio as silence/non-speech")
+
+        results = []
+        segments = []
+        start_time = time.time()
+        with tqdm(total=offset_map.kept_samples, desc="Transcribing") as pbar:
+            for region, (start, end) in enumerate(regions):
+                for data in read_wav_blocks(wf, start, end, 4000):
+                    if rec.AcceptWaveform(data.tobytes()):
+                        _collect_segment(rec.Result(), offset_map, results, segments, region)
+                    pbar.update(len(data))
+                # Flush at every cut so no utterance spans two regions
+                _collect_segment(rec.FinalResult(), offset_map, results, segments, region)
+        wf.close()
+
+        elapsed = time.time() - start_time
+        duration = total_frames / 16000
+        if duration > 0:
+            print(f"Real-time factor: {elapsed / duration:.3f} "
+                  f"({elapsed:.1f}s to transcribe {duration:.1f}s of audio)")
+
+        transcription = " ".join(text for text in results if text)
+        if return_segments:
+            return transcription, segments
+        return transcription
     except Exception as e:
         print(f"An error occurred during transcription: {str(e)}")
         return None
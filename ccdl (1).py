@@ -1,4 +1,7 @@
 import streamlit as st
+import gzip
+import hashlib
+import io
 import json
 import locale
 import os
@@ -6,15 +9,30 @@ import platform
 import random
 import shutil
 import string
+import threading
+import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from subprocess import PIPE, Popen
 from xml.etree import ElementTree as ET
 
 import requests
 from tqdm.auto import tqdm
 
-# Initialize session
+DOWNLOAD_CONNECTIONS = 4  # parallel Range requests per file
+DOWNLOAD_SEGMENT_SIZE = 16 * 1024 * 1024  # files smaller than this use a single request
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_WORKERS = 3  # files downloaded at the same time by the package scheduler
+MAX_DOWNLOAD_WORKERS = 8  # upper bound of the "Parallel downloads" slider
+JOB_WORKERS = 4  # downloads running at once, shared by every session of this server
+JOB_METADATA_WORKERS = 2  # catalog fetches, kept apart so they never queue behind downloads
+CATALOG_WAIT = 2  # seconds to wait for a catalog job before polling it; memoized catalogs finish at once
+
+# Initialize session, with a pooled connection for every segment the running jobs can fetch at once
 session = requests.sessions.Session()
+POOL_SIZE = JOB_WORKERS * MAX_DOWNLOAD_WORKERS * DOWNLOAD_CONNECTIONS + JOB_METADATA_WORKERS
+session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=POOL_SIZE))
+session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=POOL_SIZE))
 
 VERSION = 4
 VERSION_STR = '0.2.0'
@@ -57,6 +75,9 @@ ADOBE_DL_HEADERS = {
     'User-Agent': 'Creative Cloud'
 }
 
+CATALOG_CACHE_DIR = os.environ.get('CCDL_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'ccdl')
+CATALOG_MEMO_TTL = 600  # seconds before an in-process catalog is revalidated against Adobe
+
 # Helper functions
 def r(url, headers=ADOBE_REQ_HEADERS):
     """Retrieve a from a url as a string."""
@@ -64,135 +85,445 @@ def r(url, headers=ADOBE_REQ_HEADERS):
     req.encoding = 'utf-8'
     return req.text
 
-def get_products_xml(adobeurl):
-    """First stage of parsing the XML."""
-    st.write('Source URL is: ' + adobeurl)
-    return ET.fromstring(r(adobeurl))
+def add_product(products, p, hidden, urlVersion, allowedPlatforms, build_versions):
+    """Add one <product> element to the products dict.
+
+    build_versions is the (sapCode, version) -> appVersion index of the
+    top-level builds, used to resolve APRO versions under URL version 6.
+    """
+    sap = p.get('id')
+    displayName = p.find('displayName').text
+    productVersion = p.get('version')
+    if not products.get(sap):
+        products[sap] = {
+            'hidden': hidden,
+            'displayName': displayName,
+            'sapCode': sap,
+            'versions': OrderedDict()
+        }
+
+    for pf in p.findall('platforms/platform'):
+        baseVersion = pf.find('languageSet').get('baseVersion')
+        buildGuid = pf.find('languageSet').get('buildGuid')
+        appplatform = pf.get('id')
+        dependencies = list(pf.findall('languageSet/dependencies/dependency'))
+        if productVersion in products[sap]['versions']:
+            if products[sap]['versions'][productVersion]['apPlatform'] in allowedPlatforms:
+                break # There's no single-arch binary if macuniversal is available
+
+        if sap == 'APRO':
+            baseVersion = productVersion
+            if urlVersion == 4 or urlVersion == 5:
+                productVersion = pf.find('languageSet/nglLicensingInfo/appVersion').text
+            if urlVersion == 6:
+                productVersion = build_versions.get((sap, baseVersion), productVersion)
+            buildGuid = pf.find('languageSet/urls/manifestURL').text
+            # This is actually manifest URL
+
+        products[sap]['versions'][productVersion] = {
+            'sapCode': sap,
+            'baseVersion': baseVersion,
+            'productVersion': productVersion,
+            'apPlatform': appplatform,
+            'dependencies': [{
+                'sapCode': d.find('sapCode').text, 'version': d.find('baseVersion').text
+            } for d in dependencies],
+            'buildGuid': buildGuid
+        }
+
+def index_build(build_versions, b):
+    """Record the appVersion of a top-level <build>; the first match wins."""
+    app_version = b.find('nglLicensingInfo/appVersion')
+    if app_version is not None:
+        build_versions.setdefault((b.get('id'), b.get('version')), app_version.text)
 
 def parse_products_xml(products_xml, urlVersion, allowedPlatforms):
-    """2nd stage of parsing the XML."""
+    """Parse a products.xml tree (ET.fromstring) into (products, cdn).
+
+    The app uses parse_products_xml_stream; this tree-based parser is kept as
+    the reference it is tested and benchmarked against (tests/).
+    """
     if urlVersion == 6:
         prefix = 'channels/'
     else:
         prefix = ''
     cdn = products_xml.find(prefix + 'channel/cdn/secure').text
     products = {}
-    parent_map = {c: p for p in products_xml.iter() for c in p}
-    for p in products_xml.findall(prefix + 'channel/products/product'):
-        sap = p.get('id')
-        hidden = parent_map[parent_map[p]].get('name') != 'ccm'
-        displayName = p.find('displayName').text
-        productVersion = p.get('version')
-        if not products.get(sap):
-            products[sap] = {
-                'hidden': hidden,
-                'displayName': displayName,
-                'sapCode': sap,
-                'versions': OrderedDict()
-            }
-
-        for pf in p.findall('platforms/platform'):
-            baseVersion = pf.find('languageSet').get('baseVersion')
-            buildGuid = pf.find('languageSet').get('buildGuid')
-            appplatform = pf.get('id')
-            dependencies = list(pf.findall('languageSet/dependencies/dependency'))
-            if productVersion in products[sap]['versions']:
-                if products[sap]['versions'][productVersion]['apPlatform'] in allowedPlatforms:
-                    break # There's no single-arch binary if macuniversal is available
-
-            if sap == 'APRO':
-                baseVersion = productVersion
-                if urlVersion == 4 or urlVersion == 5:
-                    productVersion = pf.find('languageSet/nglLicensingInfo/appVersion').text
-                if urlVersion == 6:
-                    for b in products_xml.findall('builds/build'):
-                        if b.get("id") == sap and b.get("version") == baseVersion:
-                            productVersion = b.find('nglLicensingInfo/appVersion').text
-                            break
-                buildGuid = pf.find('languageSet/urls/manifestURL').text
-                # This is actually manifest URL
-
-            products[sap]['versions'][productVersion] = {
-                'sapCode': sap,
-                'baseVersion': baseVersion,
-                'productVersion': productVersion,
-                'apPlatform': appplatform,
-                'dependencies': [{
-                    'sapCode': d.find('sapCode').text, 'version': d.find('baseVersion').text
-                } for d in dependencies],
-                'buildGuid': buildGuid
-            }
+    build_versions = {}
+    for b in products_xml.findall('builds/build'):
+        index_build(build_versions, b)
+    for channel in products_xml.findall(prefix + 'channel'):
+        hidden = channel.get('name') != 'ccm'
+        for p in channel.findall('products/product'):
+            add_product(products, p, hidden, urlVersion, allowedPlatforms, build_versions)
+    return products, cdn
+
+def parse_products_xml_stream(source, urlVersion, allowedPlatforms):
+    """Parse products.xml in a single streaming pass.
+
+    Equivalent to parse_products_xml on the full tree, but elements are freed as
+    soon as they have been handled. source is raw XML bytes or a file object.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    if urlVersion == 6:
+        channel_path = ('channels', 'channel')
+    else:
+        channel_path = ('channel',)
+    product_path = channel_path + ('products', 'product')
+    cdn_path = channel_path + ('cdn', 'secure')
+    build_path = ('builds', 'build')
+
+    products = {}
+    build_versions = {}
+    pending_apro = []  # APRO products need the builds index, which may come after them
+    cdn = None
+    hidden = True
+    path = []
+    stack = []
+    collecting = 0  # > 0 while inside a <product> or <build> we still need whole
+
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            path.append(elem.tag)
+            stack.append(elem)
+            current = tuple(path[1:])
+            if current == channel_path:
+                hidden = elem.get('name') != 'ccm'
+            elif current == product_path or current == build_path:
+                collecting += 1
+            continue
+
+        current = tuple(path[1:])
+        keep = False
+        if current == product_path:
+            collecting -= 1
+            if urlVersion == 6 and elem.get('id') == 'APRO':
+                products.setdefault('APRO', None)  # keep the catalog order
+                pending_apro.append((elem, hidden))
+                keep = True
+            else:
+                add_product(products, elem, hidden, urlVersion, allowedPlatforms, build_versions)
+        elif current == build_path:
+            collecting -= 1
+            index_build(build_versions, elem)
+        elif current == cdn_path and cdn is None:
+            cdn = elem.text
+
+        path.pop()
+        stack.pop()
+        if stack and not collecting and not keep:
+            stack[-1].remove(elem)
+
+    for elem, apro_hidden in pending_apro:
+        add_product(products, elem, apro_hidden, urlVersion, allowedPlatforms, build_versions)
     return products, cdn
 
-def download_file(url, product_dir, s, v, name=None):
-    """Download a file"""
+def catalog_cache_path(urlVersion, installPlatform, allowedPlatforms):
+    """Path of the on-disk catalog cache for a URL version and platform set."""
+    key = '{}|{}|{}'.format(urlVersion, installPlatform, ','.join(sorted(allowedPlatforms)))
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(CATALOG_CACHE_DIR, 'products_v{}_{}.json.gz'.format(urlVersion, digest))
+
+def read_catalog_cache(path):
+    """Load a cached catalog, or None if it is missing or unreadable."""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f, object_pairs_hook=OrderedDict)
+    except (OSError, ValueError):
+        return None
+
+def write_catalog_cache(path, catalog):
+    """Atomically store a catalog as gzipped compact JSON."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(catalog, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def fetch_products_xml(adobeurl, cached=None):
+    """Download products.xml, revalidating against a cached copy.
+
+    Returns (content, validators); content is None when the server answered
+    304 Not Modified.
+    """
+    headers = ADOBE_REQ_HEADERS.copy()
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('lastModified'):
+            headers['If-Modified-Since'] = cached['lastModified']
+    req = session.get(adobeurl, headers=headers)
+    if req.status_code == 304:
+        return None, {'etag': cached.get('etag'), 'lastModified': cached.get('lastModified')}
+    req.raise_for_status()
+    return req.content, {'etag': req.headers.get('ETag'), 'lastModified': req.headers.get('Last-Modified')}
+
+@st.cache_data(ttl=CATALOG_MEMO_TTL, show_spinner=False)
+def load_catalog(urlVersion, installPlatform, allowedPlatforms):
+    """Return (products, cdn, source) for a URL version and platform set.
+
+    Memoized in-process, backed by an on-disk cache that is revalidated with
+    ETag/If-Modified-Since, so products.xml is only downloaded and parsed again
+    when Adobe actually changed it. source is 'download' or 'cache'.
+    """
+    adobeurl = ADOBE_PRODUCTS_XML_URL.format(urlVersion=urlVersion, installPlatform=installPlatform)
+    path = catalog_cache_path(urlVersion, installPlatform, allowedPlatforms)
+    cached = read_catalog_cache(path)
+    try:
+        content, validators = fetch_products_xml(adobeurl, cached)
+    except requests.RequestException:
+        if cached:
+            return cached['products'], cached['cdn'], 'cache'
+        raise
+    if content is None:
+        return cached['products'], cached['cdn'], 'cache'
+
+    products, cdn = parse_products_xml_stream(content, urlVersion, list(allowedPlatforms))
+    write_catalog_cache(path, {
+        'url': adobeurl,
+        'etag': validators['etag'],
+        'lastModified': validators['lastModified'],
+        'cdn': cdn,
+        'products': products
+    })
+    return products, cdn, 'download'
+
+def read_journal(journal_path, url, total_size):
+    """Completed segment indexes from a download journal, or None if unusable."""
+    try:
+        with open(journal_path) as f:
+            journal = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if journal.get('url') != url or journal.get('size') != total_size \
+            or journal.get('segmentSize') != DOWNLOAD_SEGMENT_SIZE:
+        return None
+    return set(journal.get('done', []))
+
+def write_journal(journal_path, url, total_size, done):
+    """Atomically record which segments of a download are complete."""
+    tmp_path = journal_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'url': url, 'size': total_size, 'segmentSize': DOWNLOAD_SEGMENT_SIZE,
+                   'done': sorted(done)}, f)
+    os.replace(tmp_path, journal_path)
+
+def verify_file(file_path, total_size, expected_hash=None):
+    """Check the size of a download and, if given, its 'algorithm:hexdigest' hash."""
+    if total_size and os.path.getsize(file_path) != total_size:
+        return False
+    if expected_hash:
+        algorithm, _, digest = expected_hash.partition(':')
+        h = hashlib.new(algorithm)
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+                h.update(block)
+        return h.hexdigest().lower() == digest.lower()
+    return True
+
+class DownloadCancelled(IOError):
+    """Raised inside a download when its job has been cancelled."""
+
+def download_segment(url, file_path, start, end, progress_bar, lock, limiter=None, cancel=None):
+    """Fetch bytes start..end (inclusive) of url into the same range of file_path."""
+    headers = ADOBE_REQ_HEADERS.copy()
+    headers['Range'] = 'bytes={}-{}'.format(start, end)
+    with session.get(url, stream=True, headers=headers) as response:
+        if response.status_code != 206:
+            raise IOError('Server ignored range request ({})'.format(response.status_code))
+        with open(file_path, 'r+b') as file:
+            file.seek(start)
+            for data in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                if cancel is not None and cancel.is_set():
+                    raise DownloadCancelled('Download cancelled')
+                if limiter:
+                    limiter.consume(len(data))
+                file.write(data)
+                with lock:
+                    progress_bar.update(len(data))
+            if file.tell() != end + 1:
+                raise IOError('Segment {}-{} is incomplete'.format(start, end))
+
+def download_file(url, product_dir, s, v, name=None, expected_hash=None,
+                  progress=None, limiter=None, log=None, cancel=None, expected_size=None):
+    """Download a file.
+
+    Large files are split into Range segments fetched in parallel over the
+    pooled session and written into a preallocated file. Finished segments are
+    recorded in a journal next to the file, so an interrupted download resumes
+    where it stopped. Returns True if the file is complete and verified.
+
+    progress, limiter and log let a caller running many downloads share one
+    DownloadProgress, one BandwidthLimiter and its own message sink; by default
+    a tqdm bar is shown and messages go to st.write. Setting the cancel event
+    stops the download, keeping the journal for a later resume. expected_size
+    and expected_hash come from the manifest when it lists them.
+    """
+    log = log or st.write
     if not name:
         name = url.split('/')[-1].split('?')[0]
-    st.write('Url is: ' + url)
-    st.write('[{}_{}] Downloading {}'.format(s, v, name))
+    log('Url is: ' + url)
+    log('[{}_{}] Downloading {}'.format(s, v, name))
     file_path = os.path.join(product_dir, name)
-    response = session.head(url, stream=True, headers=ADOBE_DL_HEADERS)
-    total_size_in_bytes = int(
-        response.headers.get('content-length', 0))
-    if os.path.isfile(file_path) and os.path.getsize(file_path) == total_size_in_bytes:
-        st.write('[{}_{}] {} already exists, skipping'.format(s, v, name))
-    else:
-        response = session.get(
-            url, stream=True, headers=ADOBE_REQ_HEADERS)
+    journal_path = file_path + '.ccdl.json'
+    progress_bar = None
+    try:
+        response = session.head(url, stream=True, headers=ADOBE_DL_HEADERS)
+        response.raise_for_status()
         total_size_in_bytes = int(
             response.headers.get('content-length', 0))
-        block_size = 1024  # 1 Kibibyte
-        progress_bar = tqdm(total=total_size_in_bytes,
-                            unit='iB', unit_scale=True)
-        with open(file_path, 'wb') as file:
-            for data in response.iter_content(block_size):
-                progress_bar.update(len(data))
-                file.write(data)
+        accepts_ranges = response.headers.get('accept-ranges', '').lower() == 'bytes'
+        if expected_size and total_size_in_bytes != expected_size:
+            raise IOError('Server reports {} bytes, the manifest {}'.format(total_size_in_bytes, expected_size))
+        if os.path.isfile(file_path) and not os.path.isfile(journal_path) \
+                and os.path.getsize(file_path) == total_size_in_bytes \
+                and verify_file(file_path, total_size_in_bytes, expected_hash):
+            log('[{}_{}] {} already exists, skipping'.format(s, v, name))
+            if progress:
+                progress.add_total(total_size_in_bytes)
+                progress.update(total_size_in_bytes)
+            return True
+
+        if progress:
+            progress.add_total(total_size_in_bytes)
+            progress_bar = progress
+        else:
+            progress_bar = tqdm(total=total_size_in_bytes,
+                                unit='iB', unit_scale=True)
+        if accepts_ranges and total_size_in_bytes > DOWNLOAD_SEGMENT_SIZE:
+            done = None
+            if os.path.isfile(file_path) and os.path.getsize(file_path) == total_size_in_bytes:
+                done = read_journal(journal_path, url, total_size_in_bytes)
+            if done is None:
+                done = set()
+                with open(file_path, 'wb') as file:
+                    file.truncate(total_size_in_bytes)
+                write_journal(journal_path, url, total_size_in_bytes, done)
+            elif done:
+                log('[{}_{}] Resuming {} ({} segments already done)'.format(s, v, name, len(done)))
+
+            segments = [(i, start, min(start + DOWNLOAD_SEGMENT_SIZE, total_size_in_bytes) - 1)
+                        for i, start in enumerate(range(0, total_size_in_bytes, DOWNLOAD_SEGMENT_SIZE))]
+            progress_bar.update(sum(end - start + 1 for i, start, end in segments if i in done))
+            lock = threading.Lock()
+            with ThreadPoolExecutor(max_workers=DOWNLOAD_CONNECTIONS) as executor:
+                futures = {executor.submit(download_segment, url, file_path, start, end,
+                                           progress_bar, lock, limiter, cancel): i
+                           for i, start, end in segments if i not in done}
+                errors = []
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except (requests.RequestException, IOError) as e:
+                        errors.append(e)
+                        continue
+                    done.add(futures[future])
+                    write_journal(journal_path, url, total_size_in_bytes, done)
+            if errors:
+                raise errors[0]
+        else:
+            response = session.get(
+                url, stream=True, headers=ADOBE_REQ_HEADERS)
+            response.raise_for_status()
+            total_size_in_bytes = int(
+                response.headers.get('content-length', 0))
+            with open(file_path, 'wb') as file:
+                for data in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    if cancel is not None and cancel.is_set():
+                        raise DownloadCancelled('Download cancelled')
+                    if limiter:
+                        limiter.consume(len(data))
+                    progress_bar.update(len(data))
+                    file.write(data)
+    except (requests.RequestException, IOError) as e:
+        if progress_bar is not None and not progress:
+            progress_bar.close()
+        log('[{}_{}] Download of {} interrupted, run again to resume: {}'.format(s, v, name, e))
+        return False
+    if not progress:
         progress_bar.close()
-        if total_size_in_bytes != 0 and progress_bar.n != total_size_in_bytes:
-            st.write("ERROR, something went wrong")
 
-# Streamlit UI
-st.title("Adobe Offline Package Downloader")
-
-# URL version input
-url_version = st.selectbox("Select URL version:", ["v4", "v5", "v6"], index=2)
-
-# Architecture input
-architecture = st.selectbox("Select architecture:", ["x86_64", "arm64"])
-
-# Get products button
-if st.button("Get Products"):
-    selectedVersion = None
-    if url_version.lower() == "v4" or url_version == "4":
-        selectedVersion = 4
-    elif url_version.lower() == "v5" or url_version == "5":
-        selectedVersion = 5
-    elif url_version.lower() == "v6" or url_version == "6":
-        selectedVersion = 6
-    else:
-        st.write('Invalid URL version selected.')
-
-    ism1 = architecture.lower() in ['arm64', 'arm', 'm1']
-    allowedPlatforms = ['macuniversal']
-    if ism1:
-        allowedPlatforms.append('macarm64')
-        st.write('Note: If the Adobe program is NOT listed here, there is no native M1 version.')
-        st.write('Use the non-native version with Rosetta 2 until an M1 version is available.')
-    else:
-        allowedPlatforms.append('osx10-64')
-        allowedPlatforms.append('osx10')
+    if not verify_file(file_path, expected_size or total_size_in_bytes, expected_hash):
+        log("ERROR, something went wrong")
+        # Neither the file nor its journal can be trusted: start over next time
+        for path in (file_path, journal_path):
+            if os.path.isfile(path):
+                os.remove(path)
+        return False
+    if os.path.isfile(journal_path):
+        os.remove(journal_path)
+    return True
+
+class BandwidthLimiter:
+    """Token bucket shared by every download thread to cap the total rate."""
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.allowance = bytes_per_second or 0  # allow a one-second burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, bytes_per_second):
+        """Change the cap (None for unlimited) for every download using it."""
+        with self.lock:
+            self.rate = bytes_per_second
+            self.allowance = bytes_per_second or 0
+            self.last = time.monotonic()
+
+    def consume(self, nbytes):
+        """Account for nbytes and sleep long enough to stay under the cap."""
+        if not self.rate:
+            return
+        with self.lock:
+            if not self.rate:
+                return
+            now = time.monotonic()
+            self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+            self.last = now
+            self.allowance -= nbytes
+            wait = -self.allowance / self.rate if self.allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+class DownloadProgress:
+    """Aggregate byte and file counters for a batch of downloads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total = 0
+        self.done = 0
+        self.files_total = 0
+        self.files_done = 0
+        self.failed = []
+        self.messages = []
 
-    productsPlatform = 'osx10-64,osx10,macarm64,macuniversal'
-    adobeurl = ADOBE_PRODUCTS_XML_URL.format(urlVersion=selectedVersion, installPlatform=productsPlatform)
+    def add_total(self, nbytes):
+        with self.lock:
+            self.total += nbytes
 
-    st.write('Downloading products.xml')
-    products_xml = get_products_xml(adobeurl)
+    def update(self, nbytes):
+        with self.lock:
+            self.done += nbytes
 
-    st.write('Parsing products.xml')
-    products, cdn = parse_products_xml(products_xml, selectedVersion, allowedPlatforms)
+    def file_finished(self, name, ok):
+        with self.lock:
+            self.files_done += 1
+            if not ok:
+                self.failed.append(name)
 
-    st.write('CDN: ' + cdn)
+    def log(self, message):
+        with self.lock:
+            self.messages.append(message)
+
+    def fraction(self):
+        with self.lock:
+            if not self.total:
+                return 0.0
+            return min(1.0, self.done / self.total)
+
+def available_products(products, allowedPlatforms):
+    """sapCode -> displayName of the visible products with a build for allowedPlatforms."""
     sapCodes = {}
     for p in products.values():
         if not p['hidden']:
@@ -203,8 +534,351 @@ if st.button("Get Products"):
                     lastv = v['productVersion']
             if lastv:
                 sapCodes[p['sapCode']] = p['displayName']
-    st.write(str(len(sapCodes)) + ' products found:')
-    for s, d in sapCodes.items():
-        st.write('[{}] {}'.format(s, d))
+    return sapCodes
+
+def find_version(products, sapCode, baseVersion, allowedPlatforms):
+    """Newest entry of sapCode built from baseVersion for an allowed platform.
+
+    Without a native build, the first build of baseVersion for any platform
+    is used (e.g. an Intel-only dependency of an arm64 download, which runs
+    under Rosetta 2), like the original ccdl does.
+    """
+    product = products.get(sapCode)
+    if not product:
+        return None
+    matching = [v for v in product['versions'].values() if v['baseVersion'] == baseVersion]
+    for v in reversed(matching):
+        if v['apPlatform'] in allowedPlatforms:
+            return v
+    return matching[0] if matching else None
+
+def resolve_dependencies(products, sapCode, version, allowedPlatforms):
+    """The selected version followed by its dependency closure, each build once."""
+    resolved = OrderedDict()
+    queue = [products[sapCode]['versions'][version]]
+    while queue:
+        v = queue.pop(0)
+        key = (v['sapCode'], v['productVersion'])
+        if key in resolved:
+            continue
+        resolved[key] = v
+        for d in v['dependencies']:
+            dep = find_version(products, d['sapCode'], d['version'], allowedPlatforms)
+            if dep is None:
+                raise ValueError('Dependency {} {} of {} is not in the catalog'.format(
+                    d['sapCode'], d['version'], v['sapCode']))
+            queue.append(dep)
+    return list(resolved.values())
+
+def get_application_json(buildGuid):
+    """Retrieve the application.json manifest of a build."""
+    headers = ADOBE_REQ_HEADERS.copy()
+    headers['x-adobe-build-guid'] = buildGuid
+    return json.loads(r(ADOBE_APPLICATION_JSON_URL, headers))
+
+def plan_packages(entry, cdn, language, dest_dir):
+    """Fetch the manifest of one build and list the files it needs.
+
+    Returns a list of (url, product_dir, name, size) tuples; size is the
+    download size the manifest lists, or None.
+    """
+    sap = entry['sapCode']
+    product_dir = os.path.join(dest_dir, sap)
+    os.makedirs(product_dir, exist_ok=True)
+    if sap == 'APRO':
+        manifest = ET.fromstring(r(cdn + entry['buildGuid']))  # buildGuid is the manifest URL
+        asset = manifest.find('asset_list/asset')
+        size = asset.findtext('asset_size')
+        return [(asset.find('asset_path').text, product_dir, None, int(size) if size else None)]
+
+    app_json = get_application_json(entry['buildGuid'])
+    with open(os.path.join(product_dir, 'application.json'), 'w') as f:
+        json.dump(app_json, f)
+    files = []
+    for pkg in app_json['Packages']['Package']:
+        if pkg.get('Type') == 'core' or not pkg.get('Condition') \
+                or language in pkg['Condition'] or language == 'ALL':
+            size = pkg.get('DownloadSize')
+            files.append((cdn + pkg['Path'], product_dir, None, int(size) if size else None))
+    return files
+
+def download_product(products, cdn, sapCode, version, allowedPlatforms, language, dest_dir,
+                     progress, max_workers=DOWNLOAD_WORKERS, limiter=None, cancel=None):
+    """Download a product together with all of its dependencies.
+
+    Manifests and packages of the whole dependency closure go through one
+    bounded worker pool sharing the aggregate progress. limiter is the
+    BandwidthLimiter of the whole process, so concurrent downloads share one
+    cap. Returns True if every file finished.
+    """
+    entries = resolve_dependencies(products, sapCode, version, allowedPlatforms)
+    progress.log('Downloading {} build(s): {}'.format(
+        len(entries), ', '.join('{}_{}'.format(e['sapCode'], e['productVersion']) for e in entries)))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        plans = list(executor.map(lambda e: plan_packages(e, cdn, language, dest_dir), entries))
+
+        # A file listed twice for the same directory is only fetched once
+        tasks = OrderedDict()
+        for entry, files in zip(entries, plans):
+            for url, product_dir, name, size in files:
+                tasks.setdefault((url, product_dir), (entry, name, size))
+        with progress.lock:
+            progress.files_total += len(tasks)
+
+        def run(url, product_dir, entry, name, size):
+            ok = False
+            try:
+                if cancel is None or not cancel.is_set():
+                    ok = download_file(url, product_dir, entry['sapCode'], entry['productVersion'], name,
+                                       progress=progress, limiter=limiter, log=progress.log, cancel=cancel,
+                                       expected_size=size)
+            except Exception as e:
+                progress.log('[{}_{}] Download of {} failed: {!r}'.format(
+                    entry['sapCode'], entry['productVersion'], url, e))
+            finally:
+                progress.file_finished(name or url.split('/')[-1].split('?')[0], ok)
+
+        futures = [executor.submit(run, url, product_dir, entry, name, size)
+                   for (url, product_dir), (entry, name, size) in tasks.items()]
+        for future in futures:
+            future.result()
+
+    root = entries[0]
+    if root['sapCode'] != 'APRO':
+        with open(os.path.join(dest_dir, 'driver.xml'), 'w') as f:
+            f.write(DRIVER_XML.format(
+                name=products[sapCode]['displayName'],
+                sapCode=root['sapCode'],
+                version=root['baseVersion'],
+                installPlatform=root['apPlatform'],
+                dependencies='\n'.join(DRIVER_XML_DEPENDENCY.format(sapCode=d['sapCode'], version=d['version'])
+                                       for d in root['dependencies']),
+                language=language))
+    return not progress.failed
+
+class Job:
+    """A catalog fetch or download running on one of the shared job executors.
+
+    target is called with the job itself, so it can report into job.progress
+    and watch job.cancel_event.
+    """
+
+    def __init__(self, label, target, executor, resumable=False):
+        self.id = ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(12))
+        self.label = label
+        self.target = target
+        self.executor = executor
+        self.resumable = resumable
+        self.state = 'queued'
+        self.progress = DownloadProgress()
+        self.cancel_event = threading.Event()
+        self.result = None
+        self.error = None
+        self.future = None
+
+    def run(self):
+        if self.cancel_event.is_set():
+            self.state = 'cancelled'
+            return
+        self.state = 'running'
+        try:
+            self.result = self.target(self)
+        except Exception as e:
+            self.error = e
+            self.state = 'failed'
+            return
+        if self.cancel_event.is_set():
+            self.state = 'cancelled'
+        elif self.result is False:
+            self.state = 'failed'
+        else:
+            self.state = 'done'
+
+    @property
+    def active(self):
+        return self.state in ('queued', 'running')
+
+class JobManager:
+    """Thread pools kept alive across Streamlit reruns.
+
+    Downloads and catalog fetches run on separate executors, so a catalog
+    request never waits for a multi-GB download to finish. Jobs are only
+    referenced from the sessions that started them.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, metadata_workers=JOB_METADATA_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ccdl-job')
+        self.metadata_executor = ThreadPoolExecutor(max_workers=metadata_workers,
+                                                    thread_name_prefix='ccdl-metadata')
+        self.limiter = BandwidthLimiter(None)  # one cap for every download of this server
+
+    def submit(self, label, target, resumable=False, metadata=False):
+        """Start target(job) on the download executor, or the metadata one."""
+        job = Job(label, target, self.metadata_executor if metadata else self.executor, resumable)
+        job.future = job.executor.submit(job.run)
+        return job
+
+    def cancel(self, job):
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.state = 'cancelled'
+
+    def resume(self, job):
+        """Run a cancelled or failed job again; finished segments are kept."""
+        job.cancel_event.clear()
+        job.progress = DownloadProgress()
+        job.result = None
+        job.error = None
+        job.state = 'queued'
+        job.future = job.executor.submit(job.run)
+
+@st.cache_resource
+def get_job_manager():
+    """The process-wide JobManager shared by all sessions and tabs."""
+    return JobManager()
+
+def session_jobs():
+    """Jobs started from this browser session, oldest first."""
+    if 'jobs' not in st.session_state:
+        st.session_state['jobs'] = OrderedDict()
+    return st.session_state['jobs']
+
+@st.fragment(run_every=1)
+def jobs_panel(jobManager, jobs):
+    """Jobs of this session; the work itself runs on the shared executor.
+
+    Only this fragment reruns every second to poll the progress, not the
+    whole script.
+    """
+    catalogJob = jobs.get(st.session_state.get('catalog_job'))
+    if st.session_state.get('catalog_pending') and not (catalogJob is not None and catalogJob.active):
+        st.rerun()  # the catalog is ready: rerun the whole script to show the product list
+
+    if jobs:
+        st.subheader('Jobs')
+    for job in reversed(jobs.values()):
+        progress = job.progress
+        st.write('**{}** - {}'.format(job.label, job.state))
+        if progress.files_total:
+            st.progress(progress.fraction(), text='{}/{} files, {:.1f}/{:.1f} MB'.format(
+                progress.files_done, progress.files_total, progress.done / 1e6, progress.total / 1e6))
+        if job.error is not None:
+            st.write('ERROR: {}'.format(job.error))
+        elif job.state == 'failed' and progress.failed:
+            st.write('Failed files: ' + ', '.join(progress.failed))
+        if job.active:
+            if st.button('Cancel', key='cancel-' + job.id):
+                jobManager.cancel(job)
+                st.rerun(scope='fragment')
+        elif job.state in ('cancelled', 'failed') and job.resumable:
+            if st.button('Resume', key='resume-' + job.id):
+                jobManager.resume(job)
+                st.rerun(scope='fragment')
+        if progress.messages:
+            with st.expander('Log'):
+                st.text('\n'.join(progress.messages))
+
+# Streamlit UI
+def main():
+    """Streamlit UI."""
+    st.title("Adobe Offline Package Downloader")
+
+    # URL version input
+    url_version = st.selectbox("Select URL version:", ["v4", "v5", "v6"], index=2)
+
+    # Architecture input
+    architecture = st.selectbox("Select architecture:", ["x86_64", "arm64"])
+
+    jobManager = get_job_manager()
+    jobs = session_jobs()
+
+    # Get products button
+    if st.button("Get Products"):
+        selectedVersion = None
+        if url_version.lower() == "v4" or url_version == "4":
+            selectedVersion = 4
+        elif url_version.lower() == "v5" or url_version == "5":
+            selectedVersion = 5
+        elif url_version.lower() == "v6" or url_version == "6":
+            selectedVersion = 6
+        else:
+            st.write('Invalid URL version selected.')
+
+        ism1 = architecture.lower() in ['arm64', 'arm', 'm1']
+        allowedPlatforms = ['macuniversal']
+        if ism1:
+            allowedPlatforms.append('macarm64')
+        else:
+            allowedPlatforms.append('osx10-64')
+            allowedPlatforms.append('osx10')
+
+        productsPlatform = 'osx10-64,osx10,macarm64,macuniversal'
+        catalogArgs = (selectedVersion, productsPlatform, tuple(allowedPlatforms))
+        job = jobManager.submit('Get products.xml v{} ({})'.format(selectedVersion, architecture),
+                                lambda job, args=catalogArgs: load_catalog(*args), metadata=True)
+        jobs.pop(st.session_state.get('catalog_job'), None)  # only the latest catalog is shown
+        jobs[job.id] = job
+        st.session_state['catalog_job'] = job.id
+        st.session_state['catalog_args'] = catalogArgs
+        # A memoized or cached catalog is ready right away; render it in this run
+        wait([job.future], timeout=CATALOG_WAIT)
+
+    # Product list, once the catalog job of this session has finished
+    catalogJob = jobs.get(st.session_state.get('catalog_job'))
+    if catalogJob is not None and catalogJob.active:
+        st.write('Loading products.xml...')
+    elif catalogJob is not None and catalogJob.state == 'failed':
+        st.write('ERROR loading products.xml: {}'.format(catalogJob.error))
+    elif catalogJob is not None and catalogJob.state == 'done':
+        products, cdn, source = catalogJob.result
+        catalogArgs = st.session_state['catalog_args']
+        allowedPlatforms = list(catalogArgs[2])
+        adobeurl = ADOBE_PRODUCTS_XML_URL.format(urlVersion=catalogArgs[0], installPlatform=catalogArgs[1])
+
+        if 'macarm64' in allowedPlatforms:
+            st.write('Note: If the Adobe program is NOT listed here, there is no native M1 version.')
+            st.write('Use the non-native version with Rosetta 2 until an M1 version is available.')
+        st.write('Source URL is: ' + adobeurl)
+        if source == 'cache':
+            st.write('products.xml unchanged, using cached catalog')
+        else:
+            st.write('Downloaded and parsed products.xml')
+        st.write('CDN: ' + cdn)
+        sapCodes = available_products(products, allowedPlatforms)
+        with st.expander(str(len(sapCodes)) + ' products found'):
+            for s, d in sapCodes.items():
+                st.write('[{}] {}'.format(s, d))
+
+        # Product download
+        sapCode = st.selectbox("Select product:", sorted(sapCodes),
+                               format_func=lambda s: '[{}] {}'.format(s, sapCodes[s]))
+        versions = [v['productVersion'] for v in products[sapCode]['versions'].values()
+                    if v['buildGuid'] and v['apPlatform'] in allowedPlatforms]
+        version = st.selectbox("Select version:", list(reversed(versions)))
+        language = st.text_input("Install language (or ALL):", value=locale.getlocale()[0] or 'en_US')
+        destRoot = st.text_input("Download folder:", value=os.path.join(os.path.expanduser('~'), 'Desktop'))
+        maxWorkers = st.slider("Parallel downloads:", 1, MAX_DOWNLOAD_WORKERS, DOWNLOAD_WORKERS)
+        bandwidthCap = st.number_input("Bandwidth cap in MB/s for all downloads (0 = unlimited):", min_value=0.0,
+                                       value=(jobManager.limiter.rate or 0) / (1024 * 1024))
+
+        if st.button("Download"):
+            destDir = os.path.join(destRoot, 'Adobe {}_{}-{}-{}'.format(
+                sapCodes[sapCode], version, language, products[sapCode]['versions'][version]['apPlatform']))
+            downloadArgs = (products, cdn, sapCode, version, allowedPlatforms, language, destDir)
+            downloadOptions = {'max_workers': maxWorkers, 'limiter': jobManager.limiter}
+            jobManager.limiter.set_rate(int(bandwidthCap * 1024 * 1024) or None)
+
+            def download_job(job, args=downloadArgs, options=downloadOptions):
+                return download_product(*args, job.progress, cancel=job.cancel_event, **options)
+
+            job = jobManager.submit('Download {} {} ({})'.format(sapCodes[sapCode], version, language),
+                                    download_job, resumable=True)
+            jobs[job.id] = job
+
+    # Remember whether the product list still waits for its catalog job
+    st.session_state['catalog_pending'] = catalogJob is not None and catalogJob.active
+    jobs_panel(jobManager, jobs)
 
-# Further interaction for product selection, version, language, etc. can be added similarly
+if __name__ == '__main__':
+    main()
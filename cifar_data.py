@@ -0,0 +1,191 @@
+"""Memory-mapped CIFAR-10 input pipeline for CNN_model.ipynb.
+
+The pickled CIFAR batches are converted once into uint8 memory-mapped arrays
+(N, 3, 32, 32). The per-channel mean and standard deviation are accumulated
+while converting, so they need no extra pass over the data. Training batches
+are then sliced straight out of the memmap, augmented and normalized as whole
+batches and prefetched by DataLoader workers, instead of decoding and
+transforming one PIL image at a time.
+"""
+
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler, SequentialSampler
+
+BATCHES_DIR = 'cifar-10-batches-py'
+TRAIN_BATCHES = ['data_batch_{}'.format(i) for i in range(1, 6)]
+TEST_BATCHES = ['test_batch']
+IMAGE_SHAPE = (3, 32, 32)
+
+
+def unpickle(file):
+    with open(file, 'rb') as fo:
+        return pickle.load(fo, encoding='bytes')
+
+
+def convert_split(batch_dir, batch_names, out_dir, split):
+    """Write one split as a uint8 memmap plus labels; return channel sums.
+
+    The sums (count, sum, sum of squares per channel) are accumulated in
+    float64 while the batches are copied, one vectorized update per batch.
+    Both files are written under temporary names and renamed when complete.
+    """
+    batches = [unpickle(os.path.join(batch_dir, name)) for name in batch_names]
+    n_images = sum(len(b[b'labels']) for b in batches)
+    images_path = os.path.join(out_dir, split + '_images.npy')
+    labels_path = os.path.join(out_dir, split + '_labels.npy')
+    images = np.lib.format.open_memmap(images_path + '.tmp', mode='w+',
+                                       dtype=np.uint8, shape=(n_images,) + IMAGE_SHAPE)
+    labels = np.empty(n_images, dtype=np.int64)
+
+    channel_sum = np.zeros(3)
+    channel_sq_sum = np.zeros(3)
+    offset = 0
+    for batch in batches:
+        # Rows are already channel-first: 1024 red, 1024 green, 1024 blue bytes
+        data = batch[b'data'].reshape((-1,) + IMAGE_SHAPE)
+        images[offset:offset + len(data)] = data
+        labels[offset:offset + len(data)] = batch[b'labels']
+        pixels = data.reshape(len(data), 3, -1).astype(np.float64) / 255.0
+        channel_sum += pixels.sum(axis=(0, 2))
+        channel_sq_sum += (pixels ** 2).sum(axis=(0, 2))
+        offset += len(data)
+    images.flush()
+    del images
+    with open(labels_path + '.tmp', 'wb') as f:
+        np.save(f, labels)
+    os.replace(images_path + '.tmp', images_path)
+    os.replace(labels_path + '.tmp', labels_path)
+    return n_images * IMAGE_SHAPE[1] * IMAGE_SHAPE[2], channel_sum, channel_sq_sum
+
+
+def memmaps_complete(out_dir):
+    """True if both splits are converted: readable images and labels of equal length."""
+    for split in ('train', 'test'):
+        try:
+            images = np.load(os.path.join(out_dir, split + '_images.npy'), mmap_mode='r')
+            labels = np.load(os.path.join(out_dir, split + '_labels.npy'), mmap_mode='r')
+        except (OSError, ValueError):
+            return False
+        if images.dtype != np.uint8 or images.shape != (len(labels),) + IMAGE_SHAPE:
+            return False
+    return True
+
+
+def prepare_cifar10(root='./data', out_dir=None):
+    """Convert CIFAR-10 to memmaps once and return (mean, std) of the train split.
+
+    Downloads the dataset with torchvision if the pickled batches are missing.
+    Later calls only read the stored statistics, as long as the memmaps they
+    belong to are complete; otherwise the conversion runs again.
+    """
+    out_dir = out_dir or os.path.join(root, 'cifar10_memmap')
+    stats_path = os.path.join(out_dir, 'stats.json')
+    if os.path.exists(stats_path) and memmaps_complete(out_dir):
+        with open(stats_path) as f:
+            stats = json.load(f)
+        return tuple(stats['mean']), tuple(stats['std'])
+
+    batch_dir = os.path.join(root, BATCHES_DIR)
+    if not os.path.isdir(batch_dir):
+        from torchvision.datasets import CIFAR10
+        CIFAR10(root=root, train=True, download=True)
+
+    os.makedirs(out_dir, exist_ok=True)
+    count, channel_sum, channel_sq_sum = convert_split(batch_dir, TRAIN_BATCHES, out_dir, 'train')
+    convert_split(batch_dir, TEST_BATCHES, out_dir, 'test')
+
+    mean = channel_sum / count
+    std = np.sqrt(channel_sq_sum / count - mean ** 2)
+    # Written last: its presence marks a finished conversion
+    with open(stats_path + '.tmp', 'w') as f:
+        json.dump({'mean': mean.tolist(), 'std': std.tolist()}, f)
+    os.replace(stats_path + '.tmp', stats_path)
+    return tuple(mean.tolist()), tuple(std.tolist())
+
+
+class CIFARMemmap(Dataset):
+    """Serves whole normalized mini-batches from the memmapped images.
+
+    Indexed with a list of sample indices (use it with a BatchSampler and
+    batch_size=None). The memmap is opened lazily so each DataLoader worker
+    maps the file itself instead of receiving a pickled copy of the array.
+    """
+
+    def __init__(self, out_dir, split, mean, std, augment=False):
+        self.images_path = os.path.join(out_dir, split + '_images.npy')
+        self.labels = np.load(os.path.join(out_dir, split + '_labels.npy'))
+        self.augment = augment
+        # (x / 255 - mean) / std folded into one multiply-add per channel
+        std = np.asarray(std, dtype=np.float32)
+        self.scale = torch.from_numpy(1.0 / (255.0 * std)).view(1, 3, 1, 1)
+        self.shift = torch.from_numpy(np.asarray(mean, dtype=np.float32) / std).view(1, 3, 1, 1)
+        self.images = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, indices):
+        if self.images is None:
+            self.images = np.load(self.images_path, mmap_mode='r')
+        # Sorted indices read the memmap front to back
+        indices = np.sort(np.asarray(indices))
+        batch = self.images[indices]
+        if self.augment:
+            batch = random_crop_flip(batch)
+        images = torch.from_numpy(np.ascontiguousarray(batch)).float()
+        images = images * self.scale - self.shift
+        return images, torch.from_numpy(self.labels[indices])
+
+
+def random_crop_flip(batch, padding=4):
+    """RandomCrop(32, padding) and RandomHorizontalFlip for a whole uint8 batch."""
+    n, _, height, width = batch.shape
+    padded = np.pad(batch, ((0, 0), (0, 0), (padding, padding), (padding, padding)))
+    top = np.random.randint(0, 2 * padding + 1, size=n)
+    left = np.random.randint(0, 2 * padding + 1, size=n)
+    rows = top[:, None] + np.arange(height)
+    cols = left[:, None] + np.arange(width)
+    flip = np.random.rand(n) < 0.5
+    cols[flip] = cols[flip, ::-1]
+    # Advanced indexing puts the (n, height, width) axes first, channels last
+    crops = padded[np.arange(n)[:, None, None], :, rows[:, :, None], cols[:, None, :]]
+    return crops.transpose(0, 3, 1, 2)
+
+
+def cifar10_loaders(root='./data', batch_size=128, num_workers=2, augment=True, prefetch_factor=4):
+    """Return (trainloader, testloader, mean, std) backed by the memmaps."""
+    out_dir = os.path.join(root, 'cifar10_memmap')
+    mean, std = prepare_cifar10(root, out_dir)
+    trainset = CIFARMemmap(out_dir, 'train', mean, std, augment=augment)
+    testset = CIFARMemmap(out_dir, 'test', mean, std)
+
+    def loader(dataset, sampler):
+        worker_options = {}
+        if num_workers > 0:
+            worker_options = {'persistent_workers': True, 'prefetch_factor': prefetch_factor}
+        return DataLoader(dataset, batch_size=None, num_workers=num_workers,
+                          sampler=BatchSampler(sampler, batch_size, drop_last=False),
+                          pin_memory=torch.cuda.is_available(), **worker_options)
+
+    trainloader = loader(trainset, RandomSampler(trainset))
+    testloader = loader(testset, SequentialSampler(testset))
+    return trainloader, testloader, mean, std
+
+
+def images_per_second(loader, step=None, max_batches=None):
+    """Images/sec over one pass of loader, running step(inputs, labels) per batch."""
+    n_images = 0
+    start = time.time()
+    for i, (inputs, labels) in enumerate(loader):
+        if max_batches is not None and i >= max_batches:
+            break
+        if step is not None:
+            step(inputs, labels)
+        n_images += len(labels)
+    return n_images / (time.time() - start)
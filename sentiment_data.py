@@ -0,0 +1,175 @@
+"""Cached tf.data input pipeline for the Seq2Seq sentiment notebook.
+
+The reviews CSV is downloaded once and the tokenized reviews are stored on
+disk, so later runs skip both the download and the Tokenizer pass. Ratings are
+mapped to sentiments with one vectorized np.select. Training streams through
+tf.data: reviews are grouped into buckets of similar length so short reviews
+are not padded to maxlen (except on TPU, which needs one static batch shape),
+and the batches are cached and prefetched.
+"""
+
+import hashlib
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+import tensorflow as tf
+from tensorflow.keras.preprocessing.text import Tokenizer
+
+DATASET_URL = 'https://drive.google.com/uc?id=1TJRGPWvCHzhBMA9yuYLgTywuen5cmcaX'
+CACHE_DIR = './cache/reviews'
+BUCKET_BOUNDARIES = [26, 51, 76]  # batches are padded to 25, 50, 75 or maxlen tokens
+
+
+def load_reviews(url=DATASET_URL, cache_dir=CACHE_DIR):
+    """Read the reviews CSV, downloading it only if it is not cached yet."""
+    os.makedirs(cache_dir, exist_ok=True)
+    csv_path = os.path.join(cache_dir, 'reviews.csv')
+    if not os.path.exists(csv_path):
+        print("Downloading dataset...")
+        response = requests.get(url, stream=True)
+        response.raise_for_status()
+        with open(csv_path + '.tmp', 'wb') as f:
+            for block in response.iter_content(1024 * 1024):
+                f.write(block)
+        os.replace(csv_path + '.tmp', csv_path)
+        print("Download complete.")
+    else:
+        print("Using cached dataset", csv_path)
+    return pd.read_csv(csv_path, low_memory=False)
+
+
+def map_ratings_to_sentiment(ratings):
+    """1-2 -> 0 (negative), 3 -> 1 (neutral), 4-5 -> 2 (positive), else neutral."""
+    ratings = np.asarray(ratings, dtype=np.float64)
+    return np.select([np.isin(ratings, (1, 2)), ratings == 3, np.isin(ratings, (4, 5))],
+                     [0, 1, 2], default=1).astype(np.int64)
+
+
+def tokenize_reviews(texts, max_features=10000, maxlen=100, cache_dir=CACHE_DIR):
+    """Tokenize texts once and cache the result.
+
+    Returns (values, row_splits, vocab_size): the token ids of all reviews
+    concatenated, with review i at values[row_splits[i]:row_splits[i + 1]],
+    truncated like pad_sequences (last maxlen tokens). vocab_size is
+    len(tokenizer.word_index) + 1, the Embedding input_dim.
+    """
+    digest = hashlib.md5()
+    for text in texts:
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    cache_key = '{}_{}_{}'.format(max_features, maxlen, digest.hexdigest()[:16])
+    cache_path = os.path.join(cache_dir, 'tokens_{}.npz'.format(cache_key))
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        return cached['values'], cached['row_splits'], int(cached['vocab_size'])
+
+    tokenizer = Tokenizer(num_words=max_features)
+    tokenizer.fit_on_texts(texts)
+    sequences = [sequence[-maxlen:] for sequence in tokenizer.texts_to_sequences(texts)]
+    lengths = np.fromiter((len(sequence) for sequence in sequences), dtype=np.int64, count=len(sequences))
+    row_splits = np.concatenate(([0], np.cumsum(lengths)))
+    values = np.fromiter((token for sequence in sequences for token in sequence),
+                         dtype=np.int32, count=int(row_splits[-1]))
+    vocab_size = len(tokenizer.word_index) + 1
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(cache_path, values=values, row_splits=row_splits, vocab_size=vocab_size)
+    with open(os.path.join(cache_dir, 'tokenizer_{}.json'.format(cache_key)), 'w') as f:
+        f.write(tokenizer.to_json())
+    return values, row_splits, vocab_size
+
+
+def row_positions(row_splits):
+    """Row id and offset within its row for every token."""
+    lengths = np.diff(row_splits)
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    offsets = np.arange(row_splits[-1]) - np.repeat(row_splits[:-1], lengths)
+    return rows, offsets, lengths
+
+
+def pad_pre(values, row_splits, maxlen):
+    """Same result as pad_sequences(sequences, maxlen) for already truncated rows."""
+    rows, offsets, lengths = row_positions(row_splits)
+    padded = np.zeros((len(lengths), maxlen), dtype=np.int32)
+    padded[rows, maxlen - np.repeat(lengths, lengths) + offsets] = values
+    return padded
+
+
+def reverse_rows(values, row_splits):
+    """Reverse the tokens of every row."""
+    starts = row_splits[:-1]
+    ends = row_splits[1:]
+    return values[np.repeat(starts + ends - 1, np.diff(row_splits)) - np.arange(row_splits[-1])]
+
+
+def make_dataset(values, row_splits, labels, indices, batch_size, num_classes=3, training=True,
+                 drop_remainder=False, bucket_boundaries=BUCKET_BOUNDARIES, maxlen=100):
+    """tf.data pipeline over the selected reviews, bucketed by length.
+
+    Batches are left-padded like pad_sequences (the padding is added on the
+    reversed rows and the batch flipped back), labels are one-hot. Bucketed
+    batches have a different sequence length per bucket, so the sequence
+    dimension stays None. With drop_remainder=True (TPU) every batch is
+    padded to maxlen instead and the batch shape is fully static, so XLA
+    compiles a single program.
+    """
+    reviews = tf.RaggedTensor.from_row_splits(reverse_rows(values, row_splits), row_splits)
+    reviews = tf.gather(reviews, indices)
+    # Slices of the RaggedTensor are 1-D ragged elements, which neither
+    # padded_batch nor bucket_by_sequence_length accept; inside map they are
+    # plain tensors, so passing them through gives dense elements
+    dataset = tf.data.Dataset.from_tensor_slices((reviews, labels[indices]))
+    dataset = dataset.map(lambda review, label: (tf.convert_to_tensor(review), label)).cache()
+    if training:
+        dataset = dataset.shuffle(len(indices), seed=42, reshuffle_each_iteration=True)
+    if drop_remainder:
+        dataset = dataset.padded_batch(batch_size, padded_shapes=([maxlen], []), drop_remainder=True)
+    else:
+        boundaries = list(bucket_boundaries) + [maxlen + 1]
+        dataset = dataset.bucket_by_sequence_length(
+            element_length_func=lambda review, label: tf.shape(review)[0],
+            bucket_boundaries=boundaries,
+            bucket_batch_sizes=[batch_size] * (len(boundaries) + 1),
+            pad_to_bucket_boundary=True)
+    dataset = dataset.map(lambda reviews, labels: (tf.reverse(reviews, axis=[1]), tf.one_hot(labels, num_classes)),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+class ThroughputLogger(tf.keras.callbacks.Callback):
+    """Prints the training throughput of every epoch in samples/sec.
+
+    The clock stops when validation starts, so only the training pass counts.
+    Pass batch_size when every batch is full (drop_remainder=True): the samples
+    are then counted as batch_size x steps, leaving out the dropped partial
+    batches. Otherwise each epoch counts num_samples.
+    """
+
+    def __init__(self, num_samples, batch_size=None):
+        super().__init__()
+        self.num_samples = num_samples
+        self.batch_size = batch_size
+        self.throughput = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.time()
+        self.train_end = None
+        self.steps = 0
+
+    def on_train_batch_end(self, batch, logs=None):
+        # batch is the index within the epoch, also with steps_per_execution > 1
+        self.steps = batch + 1
+
+    def on_test_begin(self, logs=None):
+        if getattr(self, 'epoch_start', None) is not None and self.train_end is None:
+            self.train_end = time.time()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = (self.train_end or time.time()) - self.epoch_start
+        self.epoch_start = None
+        samples = self.batch_size * self.steps if self.batch_size else self.num_samples
+        self.throughput.append(samples / elapsed)
+        print(f"Epoch {epoch + 1}: {self.throughput[-1]:.0f} samples/sec ({elapsed:.1f}s)")
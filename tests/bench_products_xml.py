@@ -0,0 +1,61 @@
+"""Parse time and peak memory of the products.xml parsers.
+
+Run with: python tests/bench_products_xml.py [n_products]
+
+Compares the original parser (ccdl_baseline, with its parent map and the
+per-APRO scan of the builds), the indexed tree parser and the streaming
+parser on the same synthetic catalog (see ccdl_fixtures). All three must
+return identical results. Memory is the tracemalloc peak of one parse,
+including the tree the tree-based parsers need.
+
+The streaming parser trades time for memory: it peaks at a fraction of the
+tree parsers' memory but is slower than both of them, up to about twice
+the original parser's time on the default 5000 products (0.2-0.4s against
+0.15-0.2s, depending on the URL version and machine). The product
+list itself is served from the cache (user-028), so the parse only runs
+when products.xml changed.
+"""
+
+import sys
+import time
+import tracemalloc
+from xml.etree import ElementTree as ET
+
+from ccdl_baseline import parse_products_xml as parse_products_xml_original
+from ccdl_fixtures import load_ccdl, make_products_xml
+
+ALLOWED = ['macuniversal', 'osx10-64', 'osx10']
+
+
+def measure(parse, repeat=3):
+    """Best wall time over repeat runs and the peak traced memory of one run."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parse()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    parse()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def main(n_products=5000):
+    ccdl = load_ccdl()
+    for url_version in (4, 5, 6):
+        xml = make_products_xml(url_version, n_products=n_products, builds_first=False)
+        parsers = [
+            ('original', lambda: parse_products_xml_original(ET.fromstring(xml), url_version, ALLOWED)),
+            ('tree', lambda: ccdl.parse_products_xml(ET.fromstring(xml), url_version, ALLOWED)),
+            ('stream', lambda: ccdl.parse_products_xml_stream(xml, url_version, ALLOWED)),
+        ]
+        results = [(name,) + measure(parse) for name, parse in parsers]
+        baseline = results[0][1]
+        assert all(result == baseline for _, result, _, _ in results), \
+            'parsers disagree for URL version {}'.format(url_version)
+        print('v{}  {:.1f} MB XML  '.format(url_version, len(xml) / 1e6) + '  '.join(
+            '{}: {:.3f}s {:.1f} MB peak'.format(name, seconds, peak / 1e6) for name, _, seconds, peak in results))
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,64 @@
+"""parse_products_xml as the downloader shipped it before the streaming parser.
+
+Kept verbatim as the baseline of tests/bench_products_xml.py and as a second
+reference for the parser tests. It builds a parent map of the whole tree and
+scans every <build> for each APRO platform.
+"""
+
+from collections import OrderedDict
+
+
+def parse_products_xml(products_xml, urlVersion, allowedPlatforms):
+    """2nd stage of parsing the XML."""
+    if urlVersion == 6:
+        prefix = 'channels/'
+    else:
+        prefix = ''
+    cdn = products_xml.find(prefix + 'channel/cdn/secure').text
+    products = {}
+    parent_map = {c: p for p in products_xml.iter() for c in p}
+    for p in products_xml.findall(prefix + 'channel/products/product'):
+        sap = p.get('id')
+        hidden = parent_map[parent_map[p]].get('name') != 'ccm'
+        displayName = p.find('displayName').text
+        productVersion = p.get('version')
+        if not products.get(sap):
+            products[sap] = {
+                'hidden': hidden,
+                'displayName': displayName,
+                'sapCode': sap,
+                'versions': OrderedDict()
+            }
+
+        for pf in p.findall('platforms/platform'):
+            baseVersion = pf.find('languageSet').get('baseVersion')
+            buildGuid = pf.find('languageSet').get('buildGuid')
+            appplatform = pf.get('id')
+            dependencies = list(pf.findall('languageSet/dependencies/dependency'))
+            if productVersion in products[sap]['versions']:
+                if products[sap]['versions'][productVersion]['apPlatform'] in allowedPlatforms:
+                    break # There's no single-arch binary if macuniversal is available
+
+            if sap == 'APRO':
+                baseVersion = productVersion
+                if urlVersion == 4 or urlVersion == 5:
+                    productVersion = pf.find('languageSet/nglLicensingInfo/appVersion').text
+                if urlVersion == 6:
+                    for b in products_xml.findall('builds/build'):
+                        if b.get("id") == sap and b.get("version") == baseVersion:
+                            productVersion = b.find('nglLicensingInfo/appVersion').text
+                            break
+                buildGuid = pf.find('languageSet/urls/manifestURL').text
+                # This is actually manifest URL
+
+            products[sap]['versions'][productVersion] = {
+                'sapCode': sap,
+                'baseVersion': baseVersion,
+                'productVersion': productVersion,
+                'apPlatform': appplatform,
+                'dependencies': [{
+                    'sapCode': d.find('sapCode').text, 'version': d.find('baseVersion').text
+                } for d in dependencies],
+                'buildGuid': buildGuid
+            }
+    return products, cdn
@@ -0,0 +1,67 @@
+"""Shared helpers for the ccdl tests: module loader and synthetic catalogs."""
+
+import importlib.util
+import os
+import random
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CCDL_PATH = os.path.join(ROOT, 'ccdl (1).py')
+
+SAP_CODES = ['PHSP', 'ILST', 'APRO', 'KBRG', 'AEFT', 'IDSN', 'PPRO']
+PLATFORMS = ['osx10-64', 'macuniversal', 'macarm64']
+
+
+def load_ccdl():
+    """Import the downloader script (its UI only runs as __main__)."""
+    spec = importlib.util.spec_from_file_location('ccdl', CCDL_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def platform_xml(platform_id, base_version, build_guid, dependencies=()):
+    deps = ''.join('<dependency><sapCode>{}</sapCode><baseVersion>{}</baseVersion></dependency>'.format(s, v)
+                   for s, v in dependencies)
+    return ('<platform id="{id}"><languageSet baseVersion="{bv}" buildGuid="{guid}">'
+            '<dependencies>{deps}</dependencies>'
+            '<nglLicensingInfo><appVersion>app{bv}</appVersion></nglLicensingInfo>'
+            '<urls><manifestURL>/manifest/{guid}.xml</manifestURL></urls>'
+            '</languageSet></platform>').format(id=platform_id, bv=base_version, guid=build_guid, deps=deps)
+
+
+def product_xml(sap_code, version, platforms):
+    return '<product id="{}" version="{}"><displayName>{} name</displayName><platforms>{}</platforms></product>'.format(
+        sap_code, version, sap_code, ''.join(platforms))
+
+
+def channel_xml(name, products, cdn=True):
+    return '<channel name="{}">{}<products>{}</products></channel>'.format(
+        name, '<cdn><secure>https://cdn.example.com</secure></cdn>' if cdn else '', ''.join(products))
+
+
+def make_products_xml(url_version, n_products=50, builds_first=True, seed=1):
+    """Synthetic products.xml bytes in the layout of the given URL version.
+
+    The ccm channel holds n_products random products (APRO included, some
+    versions repeated) with one to three platforms each, the hidden sti
+    channel holds their dependency, and the top-level builds give the APRO
+    appVersions that URL version 6 resolves; builds_first puts them before or
+    after the channels.
+    """
+    rng = random.Random(seed)
+    ccm = []
+    for i in range(n_products):
+        sap = rng.choice(SAP_CODES)
+        version = '{}.{}'.format(rng.randint(20, 25), rng.randint(0, 3))
+        platforms = [platform_xml(p, version, 'guid{}{}'.format(i, j), [('CORE', '1.0')] if j == 0 else ())
+                     for j, p in enumerate(rng.sample(PLATFORMS, rng.randint(1, 3)))]
+        ccm.append(product_xml(sap, version, platforms))
+    sti = [product_xml('CORE', '1.0', [platform_xml('osx10-64', '1.0', 'core1')])]
+    channels = channel_xml('ccm', ccm) + channel_xml('sti', sti, cdn=False)
+    if url_version == 6:
+        channels = '<channels>{}</channels>'.format(channels)
+    builds = '<builds>{}</builds>'.format(''.join(
+        '<build id="APRO" version="{0}.{1}"><nglLicensingInfo><appVersion>B{0}.{1}</appVersion>'
+        '</nglLicensingInfo></build>'.format(major, minor) for major in range(20, 26) for minor in range(4)))
+    body = builds + channels if builds_first else channels + builds
+    return '<products>{}</products>'.format(body).encode('utf-8')
@@ -0,0 +1,114 @@
+import pytest
+
+pytest.importorskip('streamlit')
+requests = pytest.importorskip('requests')
+
+from ccdl_fixtures import load_ccdl, make_products_xml
+
+ccdl = load_ccdl()
+
+ARGS = (6, 'osx10-64,osx10,macarm64,macuniversal', ('macuniversal', 'osx10-64', 'osx10'))
+ETAG = '"v1"'
+LAST_MODIFIED = 'Mon, 05 Oct 2026 10:00:00 GMT'
+
+
+class StubSession:
+    """Answers session.get with queued responses and records the request headers."""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(dict(headers or {}))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def response(status, content=b'', headers=None):
+    r = requests.Response()
+    r.status_code = status
+    r._content = content
+    r.headers.update(headers or {})
+    return r
+
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    monkeypatch.setattr(ccdl, 'CATALOG_CACHE_DIR', str(tmp_path))
+    session = StubSession()
+    monkeypatch.setattr(ccdl, 'session', session)
+    ccdl.load_catalog.clear()
+    yield session
+    ccdl.load_catalog.clear()
+
+
+def load():
+    ccdl.load_catalog.clear()  # drop the in-process memo, keep the disk cache
+    return ccdl.load_catalog(*ARGS)
+
+
+def download_response():
+    return response(200, make_products_xml(6), {'ETag': ETAG, 'Last-Modified': LAST_MODIFIED})
+
+
+def test_download_then_not_modified(stub):
+    stub.responses = [download_response(), response(304)]
+    products, cdn, source = load()
+    assert source == 'download' and cdn == 'https://cdn.example.com'
+    assert 'If-None-Match' not in stub.requests[0]
+
+    cached_products, cached_cdn, source = load()
+    assert source == 'cache'
+    assert stub.requests[1]['If-None-Match'] == ETAG
+    assert stub.requests[1]['If-Modified-Since'] == LAST_MODIFIED
+    assert cached_products == products and cached_cdn == cdn
+    assert list(cached_products) == list(products)
+
+
+def test_changed_catalog_is_parsed_again(stub):
+    stub.responses = [download_response(), response(200, make_products_xml(6, n_products=5, seed=2))]
+    first = load()
+    second = load()
+    assert second[2] == 'download' and second[0] != first[0]
+    stub.responses = [response(304)]
+    assert load()[0] == second[0]
+
+
+def test_network_error_falls_back_to_cache(stub):
+    stub.responses = [download_response(), requests.ConnectionError('offline')]
+    products = load()[0]
+    assert load() == (products, 'https://cdn.example.com', 'cache')
+
+
+def test_network_error_without_cache_raises(stub):
+    stub.responses = [requests.ConnectionError('offline')]
+    with pytest.raises(requests.ConnectionError):
+        load()
+
+
+def test_server_error_without_cache_raises(stub):
+    stub.responses = [response(500)]
+    with pytest.raises(requests.HTTPError):
+        load()
+
+
+def test_corrupt_cache_is_ignored(stub):
+    path = ccdl.catalog_cache_path(*ARGS)
+    stub.responses = [download_response()]
+    load()
+    with open(path, 'wb') as f:
+        f.write(b'not gzip at all')
+    stub.responses = [download_response()]
+    assert load()[2] == 'download'
+    assert 'If-None-Match' not in stub.requests[1]
+    assert ccdl.read_catalog_cache(path)['etag'] == ETAG
+
+
+def test_memoized_catalog_skips_the_request(stub):
+    stub.responses = [download_response()]
+    first = ccdl.load_catalog(*ARGS)
+    assert ccdl.load_catalog(*ARGS) == first
+    assert len(stub.requests) == 1
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+
+import pytest
+
+pytest.importorskip('streamlit')
+pytest.importorskip('requests')
+
+from ccdl_fixtures import load_ccdl
+
+ccdl = load_ccdl()
+
+ARM = ['macuniversal', 'macarm64']
+
+
+def build(sap, version, platform, dependencies=(), base=None):
+    return {
+        'sapCode': sap, 'baseVersion': base or version, 'productVersion': version,
+        'apPlatform': platform, 'buildGuid': 'guid-{}-{}-{}'.format(sap, version, platform),
+        'dependencies': [{'sapCode': s, 'version': v} for s, v in dependencies],
+    }
+
+
+def catalog(*builds):
+    products = {}
+    for b in builds:
+        product = products.setdefault(b['sapCode'], {
+            'hidden': False, 'displayName': b['sapCode'], 'sapCode': b['sapCode'], 'versions': OrderedDict()})
+        product['versions'][b['productVersion'] + '/' + b['apPlatform']] = b
+    return products
+
+
+def test_shared_dependency_is_resolved_once():
+    products = catalog(
+        build('PHSP', '25.0', 'macarm64', [('KBRG', '14.0'), ('CORE', '1.0')]),
+        build('KBRG', '14.0', 'macarm64', [('CORE', '1.0')]),
+        build('CORE', '1.0', 'macarm64'),
+    )
+    entries = ccdl.resolve_dependencies(products, 'PHSP', '25.0/macarm64', ARM)
+    assert [(e['sapCode'], e['productVersion']) for e in entries] == \
+        [('PHSP', '25.0'), ('KBRG', '14.0'), ('CORE', '1.0')]
+
+
+def test_native_build_is_preferred():
+    products = catalog(
+        build('PHSP', '25.0', 'macarm64', [('CORE', '1.0')]),
+        build('CORE', '1.0', 'osx10-64'),
+        build('CORE', '1.0.1', 'macarm64', base='1.0'),
+    )
+    entries = ccdl.resolve_dependencies(products, 'PHSP', '25.0/macarm64', ARM)
+    assert entries[1]['apPlatform'] == 'macarm64'
+
+
+def test_dependency_without_native_build_falls_back_to_rosetta():
+    products = catalog(
+        build('PHSP', '25.0', 'macarm64', [('CORE', '1.0')]),
+        build('CORE', '1.0', 'osx10-64'),
+        build('CORE', '1.0.1', 'osx10', base='1.0'),
+    )
+    entries = ccdl.resolve_dependencies(products, 'PHSP', '25.0/macarm64', ARM)
+    assert entries[1]['productVersion'] == '1.0' and entries[1]['apPlatform'] == 'osx10-64'
+
+
+def test_missing_dependency_is_an_error():
+    products = catalog(build('PHSP', '25.0', 'macarm64', [('CORE', '2.0')]), build('CORE', '1.0', 'macarm64'))
+    with pytest.raises(ValueError, match='CORE 2.0'):
+        ccdl.resolve_dependencies(products, 'PHSP', '25.0/macarm64', ARM)
@@ -0,0 +1,218 @@
+import hashlib
+import http.server
+import os
+import random
+import threading
+
+import pytest
+
+pytest.importorskip('streamlit')
+pytest.importorskip('requests')
+
+from ccdl_fixtures import load_ccdl
+
+ccdl = load_ccdl()
+
+SEGMENT_SIZE = 64 * 1024
+DATA = random.Random(0).randbytes(5 * SEGMENT_SIZE + 123)
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """Serves DATA at any path, with Range support and injectable faults."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        if self.path.startswith('/missing'):
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(DATA)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+    def do_GET(self):
+        server = self.server
+        payload = DATA
+        if server.corrupt:
+            payload = bytearray(DATA)
+            payload[len(DATA) // 2] ^= 0xFF
+        with server.lock:
+            server.gets += 1
+        start, end = 0, len(payload) - 1
+        if self.headers.get('Range'):
+            start, end = (int(x) for x in self.headers['Range'][len('bytes='):].split('-'))
+            with server.lock:
+                failing = server.fail_from is not None and start >= server.fail_from
+            if failing:
+                self.send_error(500)
+                return
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(payload[start:end + 1])
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(ccdl, 'DOWNLOAD_SEGMENT_SIZE', SEGMENT_SIZE)
+    monkeypatch.setattr(ccdl, 'DOWNLOAD_CHUNK_SIZE', 16 * 1024)
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.corrupt = False
+    httpd.fail_from = None
+    httpd.gets = 0
+    httpd.url = 'http://127.0.0.1:{}/pkg.zip'.format(httpd.server_port)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def download(url, directory, **kwargs):
+    progress = ccdl.DownloadProgress()
+    ok = ccdl.download_file(url, str(directory), 'TEST', '1.0', progress=progress, log=progress.log, **kwargs)
+    return ok, progress
+
+
+def sha256(data):
+    return 'sha256:' + hashlib.sha256(data).hexdigest()
+
+
+def test_full_download(server, tmp_path):
+    ok, progress = download(server.url, tmp_path, expected_hash=sha256(DATA))
+    assert ok
+    assert (tmp_path / 'pkg.zip').read_bytes() == DATA
+    assert not (tmp_path / 'pkg.zip.ccdl.json').exists()
+    assert progress.done == progress.total == len(DATA)
+    assert server.gets == 6  # one request per segment
+
+    # A complete, verified file is not downloaded again
+    ok, _ = download(server.url, tmp_path, expected_hash=sha256(DATA))
+    assert ok and server.gets == 6
+
+
+def test_failing_segment_then_resume_from_journal(server, tmp_path):
+    server.fail_from = 2 * SEGMENT_SIZE
+    ok, progress = download(server.url, tmp_path)
+    assert not ok
+    assert any('interrupted' in m for m in progress.messages)
+    journal = ccdl.read_journal(str(tmp_path / 'pkg.zip.ccdl.json'), server.url, len(DATA))
+    assert journal == {0, 1}
+
+    server.fail_from = None
+    server.gets = 0
+    ok, progress = download(server.url, tmp_path, expected_hash=sha256(DATA))
+    assert ok
+    assert any('Resuming' in m for m in progress.messages)
+    assert server.gets == 4  # only the missing segments
+    assert (tmp_path / 'pkg.zip').read_bytes() == DATA
+    assert not (tmp_path / 'pkg.zip.ccdl.json').exists()
+
+
+def test_hash_mismatch_removes_file(server, tmp_path):
+    server.corrupt = True
+    ok, _ = download(server.url, tmp_path, expected_hash=sha256(DATA))
+    assert not ok
+    assert os.listdir(tmp_path) == []
+
+    # Still corrupt on the next run: it is fetched and rejected again
+    ok, _ = download(server.url, tmp_path, expected_hash=sha256(DATA))
+    assert not ok
+    assert os.listdir(tmp_path) == []
+
+
+def test_existing_file_with_wrong_hash_is_downloaded_again(server, tmp_path):
+    corrupt = bytearray(DATA)
+    corrupt[0] ^= 0xFF
+    (tmp_path / 'pkg.zip').write_bytes(corrupt)
+    ok, progress = download(server.url, tmp_path, expected_hash=sha256(DATA))
+    assert ok
+    assert not any('already exists' in m for m in progress.messages)
+    assert (tmp_path / 'pkg.zip').read_bytes() == DATA
+
+
+def test_small_file_single_request(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(ccdl, 'DOWNLOAD_SEGMENT_SIZE', len(DATA))
+    ok, _ = download(server.url, tmp_path, expected_hash=sha256(DATA))
+    assert ok and server.gets == 1
+    assert (tmp_path / 'pkg.zip').read_bytes() == DATA
+
+
+def test_http_error_returns_false(server, tmp_path):
+    ok, progress = download(server.url.replace('pkg.zip', 'missing.zip'), tmp_path)
+    assert not ok
+    assert any('404' in m for m in progress.messages)
+    assert os.listdir(tmp_path) == []
+
+
+def test_connection_error_returns_false(tmp_path):
+    with http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler) as closed:
+        port = closed.server_port
+    ok, _ = download('http://127.0.0.1:{}/pkg.zip'.format(port), tmp_path)
+    assert not ok
+
+
+def test_download_product_records_every_file(server, tmp_path, monkeypatch):
+    products = {'TEST': {'displayName': 'Test', 'versions': {'1.0': {
+        'sapCode': 'TEST', 'baseVersion': '1.0', 'productVersion': '1.0',
+        'apPlatform': 'osx10-64', 'dependencies': [], 'buildGuid': 'guid'}}}}
+    files = [
+        (server.url, str(tmp_path), None, len(DATA)),
+        (server.url.replace('pkg.zip', 'wrong-size.zip'), str(tmp_path), None, len(DATA) + 1),
+        (server.url.replace('pkg.zip', 'missing.zip'), str(tmp_path), None, None),
+        (server.url.replace('pkg.zip', 'broken.zip'), str(tmp_path), None, None),
+    ]
+    monkeypatch.setattr(ccdl, 'plan_packages', lambda entry, cdn, language, dest_dir: files)
+    download_file = ccdl.download_file
+
+    def flaky_download_file(url, *args, **kwargs):
+        if 'broken' in url:
+            raise RuntimeError('unexpected')
+        return download_file(url, *args, **kwargs)
+
+    monkeypatch.setattr(ccdl, 'download_file', flaky_download_file)
+    progress = ccdl.DownloadProgress()
+    limiter = ccdl.BandwidthLimiter(None)
+    ok = ccdl.download_product(products, 'https://cdn', 'TEST', '1.0', ['osx10-64'], 'en_US',
+                               str(tmp_path), progress, limiter=limiter)
+    assert not ok
+    assert progress.files_total == progress.files_done == 4
+    assert sorted(progress.failed) == ['broken.zip', 'missing.zip', 'wrong-size.zip']
+    assert (tmp_path / 'pkg.zip').read_bytes() == DATA
+
+
+def test_download_product_fetches_the_dependency_closure(server, tmp_path, monkeypatch):
+    def build(sap, dependencies=()):
+        return {'sapCode': sap, 'baseVersion': '1.0', 'productVersion': '1.0', 'apPlatform': 'osx10-64',
+                'buildGuid': 'guid-' + sap, 'dependencies': [{'sapCode': d, 'version': '1.0'} for d in dependencies]}
+    products = {sap: {'displayName': sap, 'versions': {'1.0': build(sap, deps)}}
+                for sap, deps in [('PHSP', ['KBRG', 'CORE']), ('KBRG', ['CORE']), ('CORE', [])]}
+    planned = []
+
+    def plan_packages(entry, cdn, language, dest_dir):
+        planned.append(entry['sapCode'])
+        product_dir = tmp_path / entry['sapCode']
+        product_dir.mkdir()
+        files = [(server.url.replace('pkg', entry['sapCode']), str(product_dir), None, len(DATA))]
+        if entry['sapCode'] != 'CORE':
+            # Listed by two builds for the same directory: fetched once
+            files.append((server.url.replace('pkg', 'common'), str(tmp_path), None, len(DATA)))
+        return files
+
+    monkeypatch.setattr(ccdl, 'plan_packages', plan_packages)
+    progress = ccdl.DownloadProgress()
+    ok = ccdl.download_product(products, 'https://cdn', 'PHSP', '1.0', ['osx10-64'], 'en_US',
+                               str(tmp_path), progress, limiter=ccdl.BandwidthLimiter(None))
+    assert ok and not progress.failed
+    assert sorted(planned) == ['CORE', 'KBRG', 'PHSP']
+    assert progress.files_total == progress.files_done == 4
+    for name in ('PHSP/PHSP.zip', 'KBRG/KBRG.zip', 'CORE/CORE.zip', 'common.zip'):
+        assert (tmp_path / name).read_bytes() == DATA
+    driver = (tmp_path / 'driver.xml').read_text()
+    assert '<SAPCode>KBRG</SAPCode>' in driver and '<SAPCode>CORE</SAPCode>' in driver
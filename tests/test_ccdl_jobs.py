@@ -0,0 +1,47 @@
+import threading
+from concurrent.futures import wait
+
+import pytest
+
+pytest.importorskip('streamlit')
+pytest.importorskip('requests')
+
+from ccdl_fixtures import load_ccdl
+
+ccdl = load_ccdl()
+
+
+def test_catalog_jobs_do_not_wait_for_downloads():
+    manager = ccdl.JobManager(max_workers=2, metadata_workers=1)
+    release = threading.Event()
+    downloads = [manager.submit('download', lambda job: release.wait(10), resumable=True) for _ in range(3)]
+    catalog = manager.submit('catalog', lambda job: 'products', metadata=True)
+    try:
+        wait([catalog.future], timeout=5)
+        assert catalog.state == 'done' and catalog.result == 'products'
+        assert downloads[2].state == 'queued'
+    finally:
+        release.set()
+    wait([job.future for job in downloads], timeout=5)
+    assert all(job.state == 'done' for job in downloads)
+
+
+def test_cancel_and_resume_on_the_same_executor():
+    manager = ccdl.JobManager(max_workers=1, metadata_workers=1)
+    started = threading.Event()
+
+    def target(job):
+        started.set()
+        job.cancel_event.wait(10)
+        return True
+
+    job = manager.submit('download', target, resumable=True)
+    assert started.wait(5)
+    manager.cancel(job)
+    wait([job.future], timeout=5)
+    assert job.state == 'cancelled'
+
+    job.target = lambda job: True
+    manager.resume(job)
+    wait([job.future], timeout=5)
+    assert job.state == 'done' and job.executor is manager.executor
@@ -0,0 +1,102 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+
+import cifar_data
+
+PER_BATCH = 12
+
+
+@pytest.fixture
+def cifar_root(tmp_path):
+    """Pickled batches in the layout of cifar-10-batches-py, with random images."""
+    rng = np.random.default_rng(0)
+    batch_dir = tmp_path / cifar_data.BATCHES_DIR
+    batch_dir.mkdir()
+    raw = {}
+    for name in cifar_data.TRAIN_BATCHES + cifar_data.TEST_BATCHES:
+        data = rng.integers(0, 256, size=(PER_BATCH, 3072), dtype=np.uint8)
+        labels = rng.integers(0, 10, size=PER_BATCH).tolist()
+        with open(batch_dir / name, 'wb') as f:
+            pickle.dump({b'data': data, b'labels': labels}, f)
+        raw[name] = (data, labels)
+    return str(tmp_path), raw
+
+
+def train_images(raw):
+    return np.concatenate([raw[name][0] for name in cifar_data.TRAIN_BATCHES]).reshape((-1,) + cifar_data.IMAGE_SHAPE)
+
+
+def test_memmaps_and_single_pass_statistics(cifar_root):
+    root, raw = cifar_root
+    mean, std = cifar_data.prepare_cifar10(root)
+    out_dir = os.path.join(root, 'cifar10_memmap')
+
+    images = np.load(os.path.join(out_dir, 'train_images.npy'), mmap_mode='r')
+    assert np.array_equal(images, train_images(raw))
+    labels = np.load(os.path.join(out_dir, 'test_labels.npy'))
+    assert labels.tolist() == raw['test_batch'][1]
+
+    pixels = train_images(raw).astype(np.float64) / 255.0
+    assert np.allclose(mean, pixels.mean(axis=(0, 2, 3)))
+    assert np.allclose(std, pixels.std(axis=(0, 2, 3)))
+    assert not [name for name in os.listdir(out_dir) if name.endswith('.tmp')]
+
+
+def test_incomplete_memmaps_are_converted_again(cifar_root):
+    root, raw = cifar_root
+    stats = cifar_data.prepare_cifar10(root)
+    out_dir = os.path.join(root, 'cifar10_memmap')
+    assert cifar_data.prepare_cifar10(root) == stats
+
+    os.remove(os.path.join(out_dir, 'test_images.npy'))
+    assert not cifar_data.memmaps_complete(out_dir)
+    assert cifar_data.prepare_cifar10(root) == stats
+    assert cifar_data.memmaps_complete(out_dir)
+
+    path = os.path.join(out_dir, 'train_images.npy')
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+    assert not cifar_data.memmaps_complete(out_dir)
+    assert cifar_data.prepare_cifar10(root) == stats
+    assert np.array_equal(np.load(path, mmap_mode='r'), train_images(raw))
+
+
+def test_random_crop_flip_matches_per_image_reference():
+    batch = np.random.default_rng(1).integers(0, 256, size=(16,) + cifar_data.IMAGE_SHAPE, dtype=np.uint8)
+    np.random.seed(7)
+    crops = cifar_data.random_crop_flip(batch)
+
+    np.random.seed(7)
+    top = np.random.randint(0, 9, size=16)
+    left = np.random.randint(0, 9, size=16)
+    flip = np.random.rand(16) < 0.5
+    for i, image in enumerate(batch):
+        padded = np.pad(image, ((0, 0), (4, 4), (4, 4)))
+        expected = padded[:, top[i]:top[i] + 32, left[i]:left[i] + 32]
+        if flip[i]:
+            expected = expected[:, :, ::-1]
+        assert np.array_equal(crops[i], expected)
+    assert crops.shape == batch.shape and crops.dtype == np.uint8
+
+
+def test_batches_are_normalized(cifar_root):
+    root, raw = cifar_root
+    mean, std = cifar_data.prepare_cifar10(root)
+    dataset = cifar_data.CIFARMemmap(os.path.join(root, 'cifar10_memmap'), 'train', mean, std)
+    images, labels = dataset[[5, 2, 9]]
+    expected = (train_images(raw)[[2, 5, 9]] / 255.0 - np.array(mean)[:, None, None]) / np.array(std)[:, None, None]
+    assert np.allclose(images.numpy(), expected, atol=1e-5)
+    assert labels.tolist() == [raw['data_batch_1'][1][i] for i in (2, 5, 9)]
+
+
+def test_loaders_cover_every_image(cifar_root):
+    root, _ = cifar_root
+    trainloader, testloader, _, _ = cifar_data.cifar10_loaders(root, batch_size=16, num_workers=0)
+    assert sum(len(labels) for _, labels in trainloader) == 5 * PER_BATCH
+    assert [tuple(images.shape) for images, _ in testloader] == [(PER_BATCH, 3, 32, 32)]
+    assert cifar_data.images_per_second(testloader) > 0
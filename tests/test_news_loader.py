@@ -0,0 +1,91 @@
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('tqdm')
+
+import news_loader
+
+
+class StubClient:
+    def get_max_batch_size(self):
+        return 7
+
+
+class StubCollection:
+    """In-memory stand-in for a ChromaDB collection."""
+
+    def __init__(self):
+        self._client = StubClient()
+        self.records = {}
+        self.add_sizes = []
+
+    def get(self, ids, include=None):
+        return {'ids': [i for i in ids if i in self.records]}
+
+    def add(self, ids, documents, metadatas, embeddings):
+        assert len(ids) <= self._client.get_max_batch_size()
+        assert len(ids) == len(documents) == len(metadatas) == len(embeddings)
+        self.add_sizes.append(len(ids))
+        for record in zip(ids, documents, metadatas, embeddings):
+            assert record[0] not in self.records
+            self.records[record[0]] = record[1:]
+
+
+def embed(documents):
+    embed.calls.append(len(documents))
+    return [[float(len(d))] for d in documents]
+
+
+@pytest.fixture
+def news_csv(tmp_path):
+    descriptions = ['news number {}'.format(i) for i in range(25)]
+    descriptions[3] = None
+    descriptions[17] = None
+    frame = pd.DataFrame({'title': ['title {}'.format(i) for i in range(25)], 'description': descriptions})
+    frame.loc[5, 'title'] = None
+    path = tmp_path / 'news.csv'
+    frame.to_csv(path, index=False)
+    embed.calls = []
+    return str(path)
+
+
+def load(collection, path, **kwargs):
+    return news_loader.load_news_csv(collection, path, 'description', 'title', embedding_function=embed,
+                                     csv_chunk_size=10, embed_batch_size=4, **kwargs)
+
+
+def test_loads_every_row_with_text(news_csv):
+    collection = StubCollection()
+    stats = load(collection, news_csv)
+    assert stats['added'] == 23 and stats['skipped'] == 0
+    assert sorted(collection.records, key=lambda i: int(i[2:])) == \
+        ['id{}'.format(i) for i in range(25) if i not in (3, 17)]
+    # Row ids are CSV row numbers across chunk boundaries
+    assert collection.records['id12'][0] == 'news number 12'
+    assert collection.records['id12'][1] == {'title': 'title 12'}
+    assert collection.records['id5'][1] == {'title': ''}
+    assert collection.records['id24'][2] == [float(len('news number 24'))]
+    # Chunks of 10 rows, embedded 4 at a time and added at most 7 at a time
+    assert max(embed.calls) == 4
+    assert collection.add_sizes == [7, 2, 7, 2, 5]
+
+
+def test_rerun_skips_existing_ids(news_csv):
+    collection = StubCollection()
+    load(collection, news_csv, max_rows=12)
+    assert len(collection.records) == 11
+    stats = load(collection, news_csv)
+    assert stats['added'] == 12 and stats['skipped'] == 11
+    assert len(collection.records) == 23
+    stats = load(collection, news_csv)
+    assert stats['added'] == 0 and stats['skipped'] == 23
+
+
+def test_id_prefix_and_read_csv_options(tmp_path):
+    path = tmp_path / 'news.csv'
+    path.write_text('topic;title\nworld;first\nsport;second\n')
+    collection = StubCollection()
+    stats = news_loader.load_news_csv(collection, str(path), 'title', 'topic', embedding_function=embed,
+                                      id_prefix='nc', sep=';')
+    assert stats['added'] == 2
+    assert collection.records['nc1'][:2] == ('second', {'topic': 'sport'})
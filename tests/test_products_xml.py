@@ -0,0 +1,55 @@
+import json
+from xml.etree import ElementTree as ET
+
+import pytest
+
+pytest.importorskip('streamlit')
+pytest.importorskip('requests')
+
+from ccdl_baseline import parse_products_xml as parse_products_xml_original
+from ccdl_fixtures import load_ccdl, make_products_xml
+
+ccdl = load_ccdl()
+
+ALLOWED = {
+    'intel': ['macuniversal', 'osx10-64', 'osx10'],
+    'arm': ['macuniversal', 'macarm64'],
+}
+
+
+@pytest.mark.parametrize('url_version', [4, 5, 6])
+@pytest.mark.parametrize('builds_first', [True, False])
+@pytest.mark.parametrize('arch', sorted(ALLOWED))
+def test_stream_parser_matches_tree_parser(url_version, builds_first, arch):
+    xml = make_products_xml(url_version, builds_first=builds_first)
+    expected = ccdl.parse_products_xml(ET.fromstring(xml), url_version, ALLOWED[arch])
+    products, cdn = ccdl.parse_products_xml_stream(xml, url_version, ALLOWED[arch])
+    assert cdn == expected[1] == 'https://cdn.example.com'
+    # Same content and the same product and version order
+    assert json.dumps(products) == json.dumps(expected[0])
+
+
+@pytest.mark.parametrize('url_version', [4, 5, 6])
+@pytest.mark.parametrize('builds_first', [True, False])
+@pytest.mark.parametrize('arch', sorted(ALLOWED))
+def test_stream_parser_matches_original_parser(url_version, builds_first, arch):
+    xml = make_products_xml(url_version, builds_first=builds_first)
+    expected = parse_products_xml_original(ET.fromstring(xml), url_version, ALLOWED[arch])
+    assert json.dumps(ccdl.parse_products_xml_stream(xml, url_version, ALLOWED[arch])) == json.dumps(expected)
+
+
+def test_stream_parser_resolves_apro_versions_from_builds():
+    xml = make_products_xml(6, builds_first=False)
+    products, _ = ccdl.parse_products_xml_stream(xml, 6, ALLOWED['intel'])
+    assert products['APRO']['versions']
+    assert all(v.startswith('B') for v in products['APRO']['versions'])
+    assert products['CORE']['hidden'] and not products['APRO']['hidden']
+
+
+def test_stream_parser_reads_file_objects(tmp_path):
+    xml = make_products_xml(5)
+    path = tmp_path / 'products.xml'
+    path.write_bytes(xml)
+    with open(path, 'rb') as f:
+        assert ccdl.parse_products_xml_stream(f, 5, ALLOWED['arm']) == \
+            ccdl.parse_products_xml_stream(xml, 5, ALLOWED['arm'])
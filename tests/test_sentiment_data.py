@@ -0,0 +1,116 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+import sentiment_data
+
+MAXLEN = 10
+
+
+def pad_sequences_reference(sequences, maxlen):
+    """pad_sequences(sequences, maxlen) with the default pre padding and truncating."""
+    padded = np.zeros((len(sequences), maxlen), dtype=np.int32)
+    for i, sequence in enumerate(sequences):
+        sequence = sequence[-maxlen:]
+        if len(sequence):
+            padded[i, -len(sequence):] = sequence
+    return padded
+
+
+@pytest.fixture
+def ragged():
+    """Rows of random lengths (some empty) as (sequences, values, row_splits)."""
+    rng = np.random.default_rng(0)
+    sequences = [rng.integers(1, 50, size=n).tolist() for n in rng.integers(0, MAXLEN + 1, size=40)]
+    row_splits = np.concatenate(([0], np.cumsum([len(s) for s in sequences])))
+    values = np.array([token for s in sequences for token in s], dtype=np.int32)
+    return sequences, values, row_splits
+
+
+def test_map_ratings_to_sentiment():
+    ratings = [1, 2, 3, 4, 5, 0, np.nan, 6, 2.0]
+    assert sentiment_data.map_ratings_to_sentiment(ratings).tolist() == [0, 0, 1, 2, 2, 1, 1, 1, 0]
+
+
+def test_pad_pre_matches_pad_sequences(ragged):
+    sequences, values, row_splits = ragged
+    np.testing.assert_array_equal(sentiment_data.pad_pre(values, row_splits, MAXLEN),
+                                  pad_sequences_reference(sequences, MAXLEN))
+
+
+def test_reverse_rows(ragged):
+    sequences, values, row_splits = ragged
+    reversed_values = sentiment_data.reverse_rows(values, row_splits)
+    assert reversed_values.tolist() == [token for s in sequences for token in reversed(s)]
+
+
+def dataset_rows(dataset):
+    rows, labels = [], []
+    for batch_reviews, batch_labels in dataset:
+        rows.extend(batch_reviews.numpy())
+        labels.extend(np.argmax(batch_labels.numpy(), axis=1))
+    return rows, labels
+
+
+def test_make_dataset_matches_pad_pre(ragged):
+    sequences, values, row_splits = ragged
+    labels = np.arange(len(sequences)) % 3
+    indices = np.arange(5, len(sequences))
+    dataset = sentiment_data.make_dataset(values, row_splits, labels, indices, batch_size=4,
+                                          training=False, bucket_boundaries=[4, 7], maxlen=MAXLEN)
+    padded = sentiment_data.pad_pre(values, row_splits, MAXLEN)
+    rows, batch_labels = dataset_rows(dataset)
+    assert len(rows) == len(indices)
+    assert all(len(row) in (3, 6, MAXLEN) for row in rows)
+    # Buckets are emitted in their own order, so compare the rows as a multiset
+    full_rows = [tuple(np.concatenate((np.zeros(MAXLEN - len(row), dtype=np.int32), row))) for row in rows]
+    assert sorted(zip(full_rows, batch_labels)) == sorted((tuple(padded[i]), labels[i]) for i in indices)
+    assert dataset.element_spec[0].shape.as_list() == [None, None]
+
+
+def test_make_dataset_drop_remainder_is_static(ragged):
+    sequences, values, row_splits = ragged
+    labels = np.arange(len(sequences)) % 3
+    indices = np.arange(len(sequences))
+    dataset = sentiment_data.make_dataset(values, row_splits, labels, indices, batch_size=8,
+                                          training=True, drop_remainder=True, maxlen=MAXLEN)
+    assert dataset.element_spec[0].shape.as_list() == [8, MAXLEN]
+    assert dataset.element_spec[1].shape.as_list() == [8, 3]
+    rows, _ = dataset_rows(dataset)
+    assert len(rows) == len(indices) // 8 * 8
+    padded = {tuple(row) for row in sentiment_data.pad_pre(values, row_splits, MAXLEN)}
+    assert all(tuple(row) in padded for row in rows)
+
+
+def test_tokenize_reviews_is_cached(tmp_path):
+    texts = ['good phone', 'bad battery and bad screen', '', 'good good good']
+    values, row_splits, vocab_size = sentiment_data.tokenize_reviews(texts, maxlen=3, cache_dir=str(tmp_path))
+    assert np.diff(row_splits).tolist() == [2, 3, 0, 3]
+    assert vocab_size == 7
+    cached = sorted(os.listdir(tmp_path))
+    assert len(cached) == 2 and cached[0].startswith('tokenizer_') and cached[1].startswith('tokens_')
+    with open(tmp_path / cached[0]) as f:
+        assert json.load(f)['class_name'] == 'Tokenizer'
+
+    again = sentiment_data.tokenize_reviews(texts, maxlen=3, cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(again[0], values)
+    np.testing.assert_array_equal(again[1], row_splits)
+    assert again[2] == vocab_size
+    sentiment_data.tokenize_reviews(texts, maxlen=4, cache_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 4
+
+
+def test_throughput_logger_counts_full_batches(monkeypatch):
+    clock = iter([0.0, 2.0])
+    monkeypatch.setattr(sentiment_data.time, 'time', lambda: next(clock))
+    logger = sentiment_data.ThroughputLogger(num_samples=100, batch_size=8)
+    logger.on_epoch_begin(0)
+    for batch in range(12):
+        logger.on_train_batch_end(batch)
+    logger.on_test_begin()
+    logger.on_epoch_end(0)
+    assert logger.throughput == [8 * 12 / 2.0]
@@ -0,0 +1,158 @@
+import wave
+
+import numpy as np
+import pytest
+
+import vad
+
+RATE = 16000
+
+
+def voice(seconds, f0=200.0, formants=(500, 1500, 2500), level_db=-20.0, seed=0):
+    """Formant-shaped harmonic signal with a syllable-rate envelope."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * RATE)) / RATE
+    pitch = f0 * (1 + 0.05 * np.sin(2 * np.pi * 0.7 * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / RATE
+    signal = np.zeros_like(t)
+    for k in range(1, int(4000 // f0) + 1):
+        gain = sum(np.exp(-((k * f0 - f) / 200.0) ** 2) for f in formants) + 1.0 / k
+        signal += gain * np.sin(k * phase + rng.uniform(0, 2 * np.pi))
+    signal *= 0.55 + 0.45 * np.sin(2 * np.pi * 4 * t + rng.uniform(0, 2 * np.pi))
+    return scale(signal, level_db)
+
+
+def bass_voice(seconds, f0=120.0, level_db=-20.0):
+    """Voiced signal with most of its energy in the first harmonics."""
+    t = np.arange(int(seconds * RATE)) / RATE
+    signal = sum(np.sin(2 * np.pi * k * f0 * t) / k ** 2 for k in range(1, 30))
+    return scale(signal * syllables(t), level_db)
+
+
+def syllables(t, seed=3):
+    """Irregular 3-6 Hz syllable envelope."""
+    rate = np.random.default_rng(seed).uniform(3, 6, size=int(t[-1]) + 1)[t.astype(int)]
+    return 0.1 + 0.9 * np.abs(np.sin(np.pi * np.cumsum(rate) / RATE))
+
+
+def music(seconds, level_db=-20.0, note_seconds=0.5, seed=4):
+    """Held major chords with harmonics, changing every note_seconds."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * RATE)) / RATE
+    roots = 110 * 2 ** (rng.integers(0, 12, size=int(seconds / note_seconds) + 1) / 12)
+    root = roots[(t / note_seconds).astype(int)]
+    phase = 2 * np.pi * np.cumsum(root) / RATE
+    signal = sum(np.sin(k * ratio * phase) / k for ratio in (1, 1.26, 1.5) for k in range(1, 6))
+    return scale(signal, level_db)
+
+
+def noise(seconds, level_db=-20.0, seed=5):
+    return scale(np.random.default_rng(seed).standard_normal(int(seconds * RATE)), level_db)
+
+
+def silence(seconds, level_db=-65.0, seed=1):
+    noise = np.random.default_rng(seed).standard_normal(int(seconds * RATE))
+    return scale(noise, level_db)
+
+
+def hum(seconds, level_db=-25.0):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return scale(np.sin(2 * np.pi * 50 * t), level_db)
+
+
+def scale(signal, level_db):
+    rms = np.sqrt(np.mean(signal ** 2))
+    return signal * (10 ** (level_db / 20) / rms)
+
+
+def pcm(*parts):
+    return np.clip(np.concatenate(parts) * 32768, -32768, 32767).astype(np.int16)
+
+
+def kept_fraction(samples, start_s, end_s):
+    """Share of samples in [start_s, end_s) that the detected regions keep."""
+    mask = np.zeros(len(samples), dtype=bool)
+    for start, end in vad.detect_speech_regions(samples, RATE):
+        mask[start:end] = True
+    return mask[int(start_s * RATE):int(end_s * RATE)].mean()
+
+
+def test_quieter_continuous_speech_is_kept():
+    samples = pcm(voice(20, seed=0), voice(20, level_db=-35, seed=1), voice(20, seed=2))
+    assert kept_fraction(samples, 0, 60) == 1.0
+
+
+def test_quieter_speech_between_pauses_is_kept():
+    samples = pcm(voice(20, seed=0), silence(5), voice(20, level_db=-35, seed=1), silence(5), voice(10, seed=2))
+    assert kept_fraction(samples, 25, 45) == 1.0
+    assert kept_fraction(samples, 21, 24) == 0.0
+    assert kept_fraction(samples, 46, 49) == 0.0
+
+
+def test_bass_heavy_voice_is_kept():
+    samples = pcm(silence(5), bass_voice(10), silence(5))
+    assert kept_fraction(samples, 5, 15) == 1.0
+    assert kept_fraction(samples, 0, 4) == 0.0
+    assert kept_fraction(samples, 16, 20) == 0.0
+
+
+def test_silence_between_speech_is_skipped():
+    samples = pcm(voice(10), silence(10), voice(10))
+    assert kept_fraction(samples, 0, 10) == 1.0
+    assert kept_fraction(samples, 20, 30) == 1.0
+    assert kept_fraction(samples, 11, 19) == 0.0
+
+
+def test_digital_silence_does_not_lower_the_threshold():
+    samples = pcm(voice(10), np.zeros(10 * RATE), silence(10, level_db=-70), voice(10))
+    assert kept_fraction(samples, 11, 29) == 0.0
+
+
+def test_mains_hum_is_skipped():
+    samples = pcm(voice(10), silence(5), hum(10), voice(10))
+    assert kept_fraction(samples, 16, 24) == 0.0
+
+
+def test_music_intro_is_skipped_without_silence():
+    samples = pcm(music(20), voice(20))
+    assert kept_fraction(samples, 0, 18) == 0.0
+    assert kept_fraction(samples, 20, 40) == 1.0
+
+
+def test_music_and_noise_between_speech_are_skipped():
+    samples = pcm(voice(10), music(10, level_db=-15), voice(10), noise(10), voice(10))
+    assert kept_fraction(samples, 12, 18) == 0.0
+    assert kept_fraction(samples, 32, 38) == 0.0
+    assert kept_fraction(samples, 20, 30) == 1.0
+    assert kept_fraction(samples, 40, 50) == 1.0
+
+
+def test_wave_file_is_scored_in_blocks(tmp_path, monkeypatch):
+    samples = pcm(music(5), voice(5), silence(5), voice(5.01))
+    path = str(tmp_path / 'audio.wav')
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(RATE)
+        wf.writeframes(samples.tobytes())
+    monkeypatch.setattr(vad, 'VAD_BLOCK_SECONDS', 1)
+    with wave.open(path, 'rb') as wf:
+        assert vad.detect_speech_regions_wav(wf) == vad.detect_speech_regions(samples, RATE)
+        blocks = list(vad.read_wav_blocks(wf, RATE, 3 * RATE + 5))
+    assert [len(b) for b in blocks] == [RATE, RATE, 5]
+    assert np.array_equal(np.concatenate(blocks), samples[RATE:3 * RATE + 5])
+
+
+def test_short_and_empty_input():
+    assert vad.detect_speech_regions(np.zeros(0, dtype=np.int16)) == []
+    assert vad.detect_speech_regions(np.zeros(100, dtype=np.int16)) == [(0, 100)]
+
+
+def test_time_offset_map():
+    offsets = vad.TimeOffsetMap([(RATE, 3 * RATE), (10 * RATE, 11 * RATE)], RATE)
+    assert offsets.kept_samples == 3 * RATE
+    assert offsets.to_original(0) == pytest.approx(1)
+    assert offsets.to_original(1.5) == pytest.approx(2.5)
+    assert offsets.to_original(2.5) == pytest.approx(10.5)
+    assert offsets.to_original(2, region=0) == pytest.approx(3)
+    assert vad.TimeOffsetMap([], RATE).to_original(4) == 4
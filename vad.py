@@ -0,0 +1,209 @@
+"""Energy-based voice-activity detection for the Vosk transcription in app.py.
+
+Frames are scored in one vectorized pass: RMS level plus the share of the
+spectral energy that falls inside the voice band. A frame counts as speech
+when it is loud enough relative to both the noise floor and the typical
+speech level of the recording, and when the level around it rises and falls
+at syllable rate. Sustained music, hum and steady noise keep an even level
+and drop out, even in recordings with no silence to skip. Audio without a
+clear silence mode (a lecture talked through from start to end, or quieter
+passages that are still speech) is otherwise kept whole rather than trimmed.
+
+Scores can be computed from blocks read off a wave file, so a long
+recording is never held in memory as a whole.
+"""
+
+import bisect
+
+import numpy as np
+
+# Voice-activity detection settings (16 kHz mono PCM)
+VAD_FRAME_MS = 30               # analysis frame length
+VAD_THRESHOLD_DB = 12.0         # how far above the noise floor a frame must be to count as speech
+VAD_MIN_DYNAMIC_RANGE_DB = 20.0  # below this floor-to-speech range there is no silence to skip
+VAD_KEEP_WITHIN_DB = 25.0       # frames this close to the speech level are always loud enough
+VAD_DROP_BELOW_DB = 40.0        # frames this far below the speech level are always silence
+VAD_SPEECH_BAND = (80, 4000)    # voice fundamentals and formants; excludes mains hum and hiss
+VAD_MIN_BAND_RATIO = 0.5        # share of frame energy that must fall inside the voice band
+VAD_MODULATION_MS = (270, 1020)  # syllable-rate level changes: detrend and measuring windows
+VAD_MIN_MODULATION_DB = 2.0     # RMS level modulation below this is music or noise, not speech
+VAD_PADDING_MS = 300            # keep this much audio around every speech frame
+VAD_MIN_GAP_MS = 500            # gaps shorter than this are not worth skipping
+VAD_BLOCK_SECONDS = 60          # audio scored at a time
+
+
+def frame_scores(samples, sample_rate=16000):
+    """Per-frame level in dBFS and voice-band energy ratio of int16 samples."""
+    return stream_frame_scores([samples], sample_rate)
+
+
+def stream_frame_scores(blocks, sample_rate=16000):
+    """frame_scores over consecutive blocks of int16 samples.
+
+    Samples left over at the end of a block are carried into the next one,
+    so the frames are the same as for the concatenated samples.
+    """
+    frame_len = sample_rate * VAD_FRAME_MS // 1000
+    window = np.hanning(frame_len).astype(np.float32)
+    freqs = np.fft.rfftfreq(frame_len, 1.0 / sample_rate)
+    band = (freqs >= VAD_SPEECH_BAND[0]) & (freqs <= VAD_SPEECH_BAND[1])
+    levels = []
+    ratios = []
+    carry = np.zeros(0, dtype=np.int16)
+
+    # Score frames a minute at a time to keep the FFT buffers small on long videos
+    chunk = VAD_BLOCK_SECONDS * 1000 // VAD_FRAME_MS
+    for block in blocks:
+        if len(carry):
+            block = np.concatenate((carry, block))
+        n_frames = len(block) // frame_len
+        carry = block[n_frames * frame_len:]
+        for i in range(0, n_frames, chunk):
+            j = min(i + chunk, n_frames)
+            frames = block[i * frame_len:j * frame_len].reshape(j - i, frame_len).astype(np.float32) / 32768.0
+
+            # Loudness per frame in dBFS
+            rms = np.sqrt(np.mean(frames ** 2, axis=1))
+            levels.append(20 * np.log10(np.maximum(rms, 1e-10)))
+
+            # Fraction of the energy that sits in the voice band
+            spectrum = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2
+            ratios.append(spectrum[:, band].sum(axis=1) / np.maximum(spectrum.sum(axis=1), 1e-10))
+    if not levels:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    return np.concatenate(levels).astype(np.float32), np.concatenate(ratios).astype(np.float32)
+
+
+def moving_average(values, n):
+    """Centered moving average over n frames, shrinking at the edges."""
+    kernel = np.ones(n)
+    return np.convolve(values, kernel, mode='same') / np.convolve(np.ones(len(values)), kernel, mode='same')
+
+
+def level_modulation(level_db):
+    """Syllable-rate level modulation around every frame, in dB RMS.
+
+    The level is detrended with a short moving average, which keeps the 2-8 Hz
+    rise and fall of syllables but removes fades, and the residual measured
+    over about a second. Speech swings by several dB; a held chord, hum or
+    steady noise stays within a fraction of a dB.
+    """
+    detrend, measure = (max(1, ms // VAD_FRAME_MS) for ms in VAD_MODULATION_MS)
+    level = np.maximum(level_db.astype(np.float64), -100.0)  # digital silence would dominate
+    residual = level - moving_average(level, detrend)
+    return np.sqrt(moving_average(residual ** 2, measure))
+
+
+def speech_threshold(level_db):
+    """Level a frame must exceed to count as speech, or None if every level may.
+
+    The noise floor is the 10th and the speech level the 90th percentile of
+    the frame levels. Without a clear gap between them the quietest frames are
+    speech as well. Otherwise the threshold sits VAD_THRESHOLD_DB above the
+    floor, clamped to VAD_KEEP_WITHIN_DB .. VAD_DROP_BELOW_DB below the speech
+    level, so quieter speakers are kept even when the floor is high and
+    digital silence does not pull the threshold down to the noise of the
+    recording.
+    """
+    noise_floor, speech_level = np.percentile(level_db, [10, 90])
+    if speech_level - noise_floor < VAD_MIN_DYNAMIC_RANGE_DB:
+        return None
+    return float(np.clip(noise_floor + VAD_THRESHOLD_DB,
+                         speech_level - VAD_DROP_BELOW_DB, speech_level - VAD_KEEP_WITHIN_DB))
+
+
+def speech_frames(level_db, band_ratio):
+    """Boolean mask of the frames that look like speech."""
+    threshold = speech_threshold(level_db)
+    loud = level_db > threshold if threshold is not None else np.ones(len(level_db), dtype=bool)
+    voiced = (band_ratio >= VAD_MIN_BAND_RATIO) & (level_modulation(level_db) >= VAD_MIN_MODULATION_DB)
+    return loud & voiced
+
+
+def speech_regions(level_db, band_ratio, n_samples, sample_rate=16000):
+    """(start, end) sample ranges of speech from the frame scores of n_samples."""
+    frame_len = sample_rate * VAD_FRAME_MS // 1000
+    n_frames = len(level_db)
+    if n_frames == 0:
+        return [(0, n_samples)] if n_samples else []
+    speech = speech_frames(level_db, band_ratio)
+
+    # Pad every speech frame so word onsets and endings are not clipped
+    pad = max(1, VAD_PADDING_MS // VAD_FRAME_MS)
+    speech = np.convolve(speech.astype(np.int8), np.ones(2 * pad + 1, dtype=np.int8), mode='same') > 0
+
+    # Turn the frame mask into (start, end) runs
+    edges = np.diff(np.concatenate(([0], speech.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    # Merge runs separated by gaps too short to be worth skipping
+    min_gap = VAD_MIN_GAP_MS // VAD_FRAME_MS
+    regions = []
+    for start, end in zip(starts, ends):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    # Back to sample offsets; the last region keeps the trailing partial frame
+    sample_regions = [(start * frame_len, end * frame_len) for start, end in regions]
+    if sample_regions and regions[-1][1] == n_frames:
+        sample_regions[-1] = (sample_regions[-1][0], n_samples)
+    return sample_regions
+
+
+def detect_speech_regions(samples, sample_rate=16000):
+    """Return a list of (start, end) sample ranges that contain speech."""
+    level_db, band_ratio = frame_scores(samples, sample_rate)
+    return speech_regions(level_db, band_ratio, len(samples), sample_rate)
+
+
+def read_wav_blocks(wf, start=0, end=None, block_frames=None):
+    """Yield int16 blocks of an open 16-bit mono wave file from start to end."""
+    end = wf.getnframes() if end is None else end
+    block_frames = block_frames or VAD_BLOCK_SECONDS * wf.getframerate()
+    wf.setpos(start)
+    position = start
+    while position < end:
+        data = wf.readframes(min(block_frames, end - position))
+        if not data:
+            break
+        block = np.frombuffer(data, dtype=np.int16)
+        position += len(block)
+        yield block
+
+
+def detect_speech_regions_wav(wf):
+    """detect_speech_regions for an open wave file, reading it a minute at a time."""
+    sample_rate = wf.getframerate()
+    level_db, band_ratio = stream_frame_scores(read_wav_blocks(wf), sample_rate)
+    return speech_regions(level_db, band_ratio, wf.getnframes(), sample_rate)
+
+
+class TimeOffsetMap:
+    """Maps times on the speech-only stream back to times in the original audio."""
+
+    def __init__(self, regions, sample_rate=16000):
+        self.sample_rate = sample_rate
+        self.kept_starts = []
+        self.original_starts = []
+        kept = 0
+        for start, end in regions:
+            self.kept_starts.append(kept)
+            self.original_starts.append(start)
+            kept += end - start
+        self.kept_samples = kept
+
+    def to_original(self, seconds, region=None):
+        """Original time of seconds on the kept stream.
+
+        region pins the result to one region, for times that fall exactly on
+        its end (the start of the next region on the kept stream).
+        """
+        if not self.kept_starts:
+            return seconds
+        sample = seconds * self.sample_rate
+        if region is None:
+            region = max(0, bisect.bisect_right(self.kept_starts, sample) - 1)
+        return (sample - self.kept_starts[region] + self.original_starts[region]) / self.sample_rate